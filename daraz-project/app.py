@@ -240,12 +240,16 @@ import time
 import pandas as pd
 from datetime import datetime
 import json
+import shutil
 import logging  # ADD THIS LINE
 
 # Import your scripts
 import scraper
-import preprocess
-import dims
+import http_pool
+import price_rollups
+import image_store
+import tables
+import pipeline
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
@@ -273,7 +277,14 @@ swagger = Swagger(app, config=swagger_config)
 RAW_CSV = "raw_products.csv"
 PROCESSED_CSV = "processed_products.csv"
 ENHANCED_CSV = "processed_products_enhanced.csv"
-PRICE_HISTORY = "price_history.csv"
+PRICE_STORE, PRICE_HISTORY = scraper.price_store()
+PRICE_ROLLUPS = price_rollups.ROLLUP_DIR
+
+# Content-addressed images never change, so they can be cached for a year
+IMAGE_MAX_AGE = 365 * 24 * 3600
+
+# Price moves (in percent) pushed to clients as `price_change` events
+PRICE_ALERT_THRESHOLD = 5.0
 
 # Performance metrics
 metrics = {
@@ -290,6 +301,9 @@ running_processes = {
     "processing": False
 }
 
+# Frontier of the crawl in progress, if any
+active_frontier = None
+
 def broadcast_status():
     """Broadcast status to all connected WebSocket clients"""
     status = get_status_data()
@@ -308,7 +322,7 @@ def get_status_data():
             "raw_csv_exists": os.path.exists(RAW_CSV),
             "processed_csv_exists": os.path.exists(PROCESSED_CSV),
             "enhanced_csv_exists": os.path.exists(ENHANCED_CSV),
-            "price_history_exists": os.path.exists(PRICE_HISTORY),
+            "price_history_exists": PRICE_STORE.exists(PRICE_HISTORY),
             "plots_exist": plots_exist
         },
         "processes": running_processes,
@@ -316,6 +330,10 @@ def get_status_data():
         "timestamp": datetime.now().isoformat()
     }
 
+def emit_price_change(change):
+    """Push a price change detected during a scrape to all WebSocket clients"""
+    socketio.emit('price_change', {**change, 'timestamp': change['timestamp'].isoformat()})
+
 def run_in_thread(target, *args, **kwargs):
     thread = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
     thread.start()
@@ -368,11 +386,14 @@ def home():
             "/status": "System status",
             "/metrics": "Performance metrics",
             "/scrape": "Start scraping",
+            "/crawl": "Crawl several search terms",
             "/process": "Process data",
             "/all": "Run full pipeline",
             "/csv": "Download CSV",
             "/search": "Search products",
             "/price-changes": "Get price changes",
+            "/products/<id>/history": "Price history of one product",
+            "/products/<id>/chart": "OHLC price chart of one product",
             "/plot/<name>": "Get plot",
             "/images/<filename>": "Get product image",
             "/dashboard": "Web dashboard",
@@ -412,8 +433,63 @@ def get_metrics():
     uptime = time.time() - app.config.get('start_time', time.time())
     metrics["requests_per_minute"] = (metrics["requests"] / uptime) * 60 if uptime > 0 else 0
     
+    # Connection reuse of the shared scraper session
+    metrics["http_pool"] = http_pool.pool_stats()
+    
     return jsonify(metrics)
 
+def crawl(terms, max_pages=5, priority=0):
+    """
+    Crawl into RAW_CSV, exposing the frontier so /crawl can add terms to it.
+    
+    Returns:
+        int: Number of products scraped
+    """
+    global active_frontier
+    active_frontier = scraper.create_frontier(max_pages=max_pages)
+    try:
+        return scraper.scrape_terms(
+            terms,
+            max_pages=max_pages,
+            out_file=RAW_CSV,
+            download_images=True,
+            frontier=active_frontier,
+            priority=priority,
+            on_price_change=emit_price_change,
+            price_change_threshold=PRICE_ALERT_THRESHOLD
+        )
+    finally:
+        active_frontier = None
+
+def scrape_job(terms, max_pages=5, priority=0):
+    """Run a crawl in the background, reporting progress to the dashboard"""
+    running_processes["scraping"] = True
+    broadcast_status()
+    
+    try:
+        start_time = time.time()
+        socketio.emit('log', {'message': f'📥 Starting scraping: {", ".join(terms)}...', 'type': 'info'})
+        
+        num_products = crawl(terms, max_pages=max_pages, priority=priority)
+        
+        duration = time.time() - start_time
+        metrics["scraping_duration"] = duration
+        metrics["last_scrape"] = datetime.now().isoformat()
+        
+        socketio.emit('log', {
+            'message': f'✅ Scraping completed: {num_products} products in {duration:.1f}s',
+            'type': 'success'
+        })
+        
+        print(f"✅ Scraper finished, {num_products} products saved.")
+    except Exception as e:
+        metrics["errors"] += 1
+        socketio.emit('log', {'message': f'❌ Scraping failed: {str(e)}', 'type': 'error'})
+        print(f"❌ Scraper failed: {e}")
+    finally:
+        running_processes["scraping"] = False
+        broadcast_status()
+
 @app.route("/scrape")
 def run_scraper():
     """
@@ -430,42 +506,76 @@ def run_scraper():
     if running_processes["scraping"]:
         return jsonify({"error": "Scraping already in progress"}), 409
     
-    def scrape_thread():
-        running_processes["scraping"] = True
-        broadcast_status()
-        
-        try:
-            start_time = time.time()
-            socketio.emit('log', {'message': '📥 Starting scraping...', 'type': 'info'})
-            
-            num_products = scraper.scrape_laptops(
-                search_term="laptop", 
-                max_pages=5, 
-                out_file=RAW_CSV,
-                download_images=True
-            )
-            
-            duration = time.time() - start_time
-            metrics["scraping_duration"] = duration
-            metrics["last_scrape"] = datetime.now().isoformat()
-            
-            socketio.emit('log', {
-                'message': f'✅ Scraping completed: {num_products} products in {duration:.1f}s',
-                'type': 'success'
-            })
-            
-            print(f"✅ Scraper finished, {num_products} products saved.")
-        except Exception as e:
-            metrics["errors"] += 1
-            socketio.emit('log', {'message': f'❌ Scraping failed: {str(e)}', 'type': 'error'})
-            print(f"❌ Scraper failed: {e}")
-        finally:
-            running_processes["scraping"] = False
-            broadcast_status()
-
-    run_in_thread(scrape_thread)
+    run_in_thread(scrape_job, ["laptop"], max_pages=5)
     return jsonify({"status": "Scraper started in background"}), 202
 
+@app.route("/crawl", methods=['POST'])
+def crawl_terms():
+    """
+    Crawl Search Terms
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            terms:
+              type: array
+              items:
+                type: string
+              description: Search terms to crawl
+            max_pages:
+              type: integer
+              description: Pages per term
+            priority:
+              type: integer
+              description: Lower values are crawled first
+    responses:
+      202:
+        description: Crawl started, or terms added to the running crawl
+      400:
+        description: No terms given, or max_pages or priority is not a valid integer
+      409:
+        description: Running crawl is finishing
+    """
+    metrics["requests"] += 1
+    
+    data = request.get_json() or {}
+    terms = data.get('terms') or []
+    if isinstance(terms, str):
+        terms = [terms]
+    if not terms:
+        return jsonify({"error": "No search terms given"}), 400
+    try:
+        max_pages = int(data.get('max_pages', 5))
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "max_pages and priority must be integers"}), 400
+    if max_pages < 1:
+        return jsonify({"error": "max_pages must be at least 1"}), 400
+    
+    # Join the running crawl so all terms share one politeness budget
+    if running_processes["scraping"]:
+        frontier = active_frontier
+        added = [frontier.add_term(t, priority=priority, max_pages=max_pages) for t in terms] if frontier else [None]
+        if None in added:
+            return jsonify({"error": "Current crawl is starting or finishing, retry shortly"}), 409
+        return jsonify({"status": "Terms added to running crawl", "queued_pages": sum(added)}), 202
+    
+    run_in_thread(scrape_job, terms, max_pages=max_pages, priority=priority)
+    return jsonify({"status": "Crawl started in background", "terms": terms}), 202
+
+def emit_pipeline_report(report):
+    """Tell dashboard clients which pipeline stages ran and which were reused"""
+    for stage in report:
+        if stage["status"] == "reused":
+            message = f'♻️ {stage["stage"]}: inputs unchanged, reused previous output'
+        else:
+            message = f'✅ {stage["stage"]}: executed in {stage["duration"]:.1f}s'
+        socketio.emit('log', {'message': message, 'type': 'info'})
+
 @app.route("/process")
 def run_process():
     """
@@ -495,11 +605,10 @@ def run_process():
             start_time = time.time()
             socketio.emit('log', {'message': '🔄 Starting preprocessing...', 'type': 'info'})
             
-            num_rows = preprocess.run(input_file=RAW_CSV, output_file=PROCESSED_CSV)
-            
-            socketio.emit('log', {'message': '📊 Starting dimensionality reduction...', 'type': 'info'})
-            
-            result = dims.run(input_file=PROCESSED_CSV)
+            outcome = pipeline.run(raw_csv=RAW_CSV, processed_csv=PROCESSED_CSV)
+            emit_pipeline_report(outcome["report"])
+            num_rows = outcome["results"]["preprocess"]
+            result = outcome["results"]["dims"]
             
             duration = time.time() - start_time
             metrics["processing_duration"] = duration
@@ -545,22 +654,16 @@ def run_all():
         try:
             # Scraping
             socketio.emit('log', {'message': '📥 Starting full pipeline: Scraping...', 'type': 'info'})
-            num_products = scraper.scrape_laptops(
-                search_term="laptop", 
-                max_pages=5, 
-                out_file=RAW_CSV,
-                download_images=True
-            )
+            # Through the shared frontier, so /crawl can add terms meanwhile
+            num_products = crawl(["laptop"], max_pages=5)
             running_processes["scraping"] = False
             broadcast_status()
             
-            # Processing
-            socketio.emit('log', {'message': '🔄 Preprocessing data...', 'type': 'info'})
-            num_rows = preprocess.run(input_file=RAW_CSV, output_file=PROCESSED_CSV)
-            
-            # Dims
-            socketio.emit('log', {'message': '📊 Generating visualizations...', 'type': 'info'})
-            result = dims.run(input_file=PROCESSED_CSV)
+            # Processing and visualizations, skipping stages whose inputs did not change
+            socketio.emit('log', {'message': '🔄 Preprocessing data and generating visualizations...', 'type': 'info'})
+            outcome = pipeline.run(raw_csv=RAW_CSV, processed_csv=PROCESSED_CSV)
+            emit_pipeline_report(outcome["report"])
+            result = outcome["results"]["dims"]
             
             socketio.emit('log', {
                 'message': f'🎉 Pipeline completed! {num_products} products, {len(result["plots"])} plots',
@@ -600,6 +703,20 @@ def get_csv():
     else:
         return jsonify({"error": "CSV not found. Run /process first"}), 404
 
+def with_local_images(df):
+    """
+    Point local_image at images stored since the table was built.
+    
+    Scrapes finish before their images do, so the processed table may
+    predate them; the image store knows every image downloaded so far.
+    """
+    if 'image_url' not in df.columns:
+        return df
+    store = image_store.get_store()
+    stored = df['image_url'].map(lambda url: store.lookup(url) if isinstance(url, str) else None)
+    known = df['local_image'] if 'local_image' in df.columns else None
+    return df.assign(local_image=stored.where(stored.notna(), known))
+
 @app.route("/search", methods=['POST'])
 def search_products():
     """
@@ -649,7 +766,7 @@ def search_products():
     if not os.path.exists(csv_file):
         return jsonify({"error": "No data available"}), 404
     
-    df = pd.read_csv(csv_file)
+    df = tables.read(csv_file, "enhanced" if csv_file == ENHANCED_CSV else "processed")
     
     # Get filter parameters
     data = request.get_json() or {}
@@ -689,7 +806,7 @@ def search_products():
     
     return jsonify({
         "total": len(filtered),
-        "products": filtered.head(50).to_dict('records')
+        "products": tables.records(with_local_images(filtered.head(50)))
     })
 
 @app.route("/price-changes")
@@ -705,7 +822,7 @@ def get_price_changes():
     """
     metrics["requests"] += 1
     
-    if not os.path.exists(PRICE_HISTORY):
+    if not PRICE_STORE.exists(PRICE_HISTORY):
         return jsonify({"error": "No price history available"}), 404
     
     changes = scraper.get_price_changes(PRICE_HISTORY)
@@ -716,6 +833,104 @@ def get_price_changes():
         "all_changes": changes[:20]
     })
 
+@app.route("/products/<product_id>/history")
+def get_product_history(product_id):
+    """
+    Get Product Price History
+    ---
+    parameters:
+      - name: product_id
+        in: path
+        type: string
+        required: true
+        description: Product id, e.g. i123456
+      - name: start
+        in: query
+        type: string
+        description: Earliest observation time (ISO format)
+      - name: end
+        in: query
+        type: string
+        description: Latest observation time (ISO format)
+    responses:
+      200:
+        description: Price observations, oldest first
+      400:
+        description: Invalid time range
+      404:
+        description: No history for this product
+    """
+    metrics["requests"] += 1
+    
+    try:
+        start = pd.Timestamp(request.args['start']) if request.args.get('start') else None
+        end = pd.Timestamp(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({"error": "start and end must be ISO timestamps"}), 400
+    
+    history = scraper.get_product_history(product_id, PRICE_HISTORY, start=start, end=end)
+    if not history:
+        return jsonify({"error": "No price history for this product"}), 404
+    
+    return jsonify({
+        "product_id": product_id,
+        "total": len(history),
+        "history": history
+    })
+
+@app.route("/products/<product_id>/chart")
+def get_product_chart(product_id):
+    """
+    Get Product Price Chart
+    ---
+    parameters:
+      - name: product_id
+        in: path
+        type: string
+        required: true
+        description: Product id, e.g. i123456
+      - name: start
+        in: query
+        type: string
+        description: Start of the range (ISO format, default 30 days before end)
+      - name: end
+        in: query
+        type: string
+        description: End of the range (ISO format, default now)
+      - name: points
+        in: query
+        type: integer
+        description: Maximum number of points (default 500)
+    responses:
+      200:
+        description: OHLC buckets at the finest resolution that fits
+      400:
+        description: Invalid range or point budget
+      404:
+        description: No price data for this product in the range
+    """
+    metrics["requests"] += 1
+    
+    try:
+        chart = scraper.get_price_chart(
+            product_id,
+            start=request.args.get('start') or None,
+            end=request.args.get('end') or None,
+            max_points=int(request.args.get('points', 500))
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if not chart["points"]:
+        return jsonify({"error": "No price data for this product in this range"}), 404
+    
+    return jsonify({
+        "product_id": product_id,
+        "resolution": chart["resolution"],
+        "total": len(chart["points"]),
+        "points": chart["points"]
+    })
+
 @app.route("/plot/<name>")
 def get_plot(name):
     """
@@ -776,18 +991,42 @@ def get_image(filename):
         in: path
         type: string
         required: true
+      - name: size
+        in: query
+        type: string
+        description: Pass "thumb" for a small thumbnail
     responses:
       200:
         description: Image file
+      304:
+        description: Image unchanged since the client's copy (If-None-Match)
       404:
         description: Image not found
     """
     metrics["requests"] += 1
     
-    image_path = os.path.join('static/images', filename)
-    if os.path.exists(image_path):
-        return send_file(image_path, mimetype='image/jpeg')
-    return jsonify({"error": "Image not found"}), 404
+    store = image_store.get_store()
+    image_path = os.path.join(store.images_dir, filename)
+    if not os.path.exists(image_path):
+        return jsonify({"error": "Image not found"}), 404
+    
+    thumb = None
+    if request.args.get('size') == 'thumb':
+        thumb = store.thumbnail(filename)
+        if thumb is None:
+            # No thumbnail to be had: the original, but not cached for good under the thumbnail's URL
+            return send_file(image_path, conditional=True, max_age=3600)
+        image_path = thumb
+    
+    if not image_store.is_content_addressed(filename):
+        # Legacy file names: validated by modification time, cached briefly
+        return send_file(image_path, conditional=True, max_age=3600)
+    
+    # A content-addressed file never changes, so its hash is a strong ETag
+    etag = os.path.splitext(filename)[0] + ("-thumb" if thumb else "")
+    response = send_file(image_path, etag=etag, conditional=True, max_age=IMAGE_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
 
 @app.route("/stats")
 def get_stats():
@@ -822,7 +1061,8 @@ def get_clusters():
     if not os.path.exists(ENHANCED_CSV):
         return jsonify({"error": "Enhanced data not available"}), 404
     
-    df = pd.read_csv(ENHANCED_CSV)
+    df = tables.read(ENHANCED_CSV, "enhanced",
+                     columns=['cluster_kmeans', 'price', 'ram_gb', 'storage_gb', 'rating'])
     
     if 'cluster_kmeans' not in df.columns:
         return jsonify({"error": "Clustering not performed yet"}), 404
@@ -861,11 +1101,27 @@ def clean_files():
     
     removed = []
     
-    # Remove CSV files
-    for f in [RAW_CSV, PROCESSED_CSV, ENHANCED_CSV, PRICE_HISTORY]:
-        if os.path.exists(f):
-            os.remove(f)
-            removed.append(f)
+    # Remove CSV files and the Arrow files next to them
+    for f in [RAW_CSV, PROCESSED_CSV, ENHANCED_CSV]:
+        for path in [f, tables.arrow_path(f)]:
+            if os.path.exists(path):
+                os.remove(path)
+                removed.append(path)
+    
+    if os.path.exists(pipeline.PIPELINE_CACHE):
+        os.remove(pipeline.PIPELINE_CACHE)
+        removed.append(pipeline.PIPELINE_CACHE)
+    
+    # Remove price history (partition directory or SQLite database)
+    if os.path.isdir(PRICE_HISTORY):
+        shutil.rmtree(PRICE_HISTORY)
+        removed.append(PRICE_HISTORY)
+    elif os.path.exists(PRICE_HISTORY):
+        os.remove(PRICE_HISTORY)
+        removed.append(PRICE_HISTORY)
+    if os.path.isdir(PRICE_ROLLUPS):
+        shutil.rmtree(PRICE_ROLLUPS)
+        removed.append(PRICE_ROLLUPS)
     
     # Remove plot files
     if os.path.exists('static/plots'):
@@ -878,7 +1134,10 @@ def clean_files():
     if os.path.exists('static/images'):
         for f in os.listdir('static/images'):
             filepath = os.path.join('static/images', f)
-            os.remove(filepath)
+            if os.path.isdir(filepath):
+                shutil.rmtree(filepath)
+            else:
+                os.remove(filepath)
             removed.append(filepath)
     
     broadcast_status()
@@ -0,0 +1,89 @@
+"""
+Append-only archive of raw Daraz catalog responses.
+Every fetched catalog page is stored compressed, keyed by (term, page, fetch
+time), so parsing can be changed and re-run offline without re-crawling.
+"""
+
+import glob
+import gzip
+import json
+import os
+import threading
+import zlib
+from datetime import datetime
+
+ARCHIVE_DIR = "archive"
+
+class ResponseArchive:
+    """Writes one gzip-compressed JSON-lines segment per crawl"""
+
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        os.makedirs(archive_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.path = os.path.join(archive_dir, f"responses_{stamp}_{os.getpid()}.jsonl.gz")
+        self.count = 0
+        self._file = gzip.open(self.path, 'ab')
+        self._lock = threading.Lock()
+
+    def record(self, term, page, url, body):
+        """Append one raw response body"""
+        line = json.dumps({
+            "term": term,
+            "page": page,
+            "fetched_at": datetime.now().isoformat(),
+            "url": url,
+            "body": body
+        }, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line.encode('utf-8') + b"\n")
+            # Sync flush keeps everything written so far readable after a crash
+            self._file.flush(zlib.Z_SYNC_FLUSH)
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def segments(archive_dir=ARCHIVE_DIR):
+    """Archive segment paths, oldest first"""
+    return sorted(glob.glob(os.path.join(archive_dir, "responses_*.jsonl.gz")))
+
+
+def iter_records(archive_dir=ARCHIVE_DIR):
+    """
+    Stream archived responses in the order they were written.
+
+    A segment cut short by a crash is read up to its last complete record.
+    """
+    for path in segments(archive_dir):
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        break
+        except (EOFError, OSError, zlib.error):
+            continue
+
+
+def latest_pages(archive_dir=ARCHIVE_DIR, until=None):
+    """
+    Find the most recent archived fetch of every (term, page).
+
+    Args:
+        archive_dir (str): Archive directory
+        until (str): Only consider fetches at or before this ISO timestamp
+
+    Returns:
+        dict: (term, page) -> fetched_at of the winning record
+    """
+    latest = {}
+    for record in iter_records(archive_dir):
+        if until and record["fetched_at"] > until:
+            continue
+        key = (record["term"], record["page"])
+        if record["fetched_at"] >= latest.get(key, ""):
+            latest[key] = record["fetched_at"]
+    return latest
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark catalog decoding over archived pages.
+Usage: python bench_parse.py [archive_dir] [repeat]
+"""
+
+import json
+import sys
+import time
+
+import archive
+import catalog_decoder
+
+FIELDS = catalog_decoder.FIELDS
+
+def legacy_decode(body):
+    """Full json.loads plus dict lookups, as scrape_laptops originally did"""
+    data = json.loads(body)
+    items = data.get("mods", {}).get("listItems", [])
+    return [tuple(hit.get(field) for field in FIELDS) for hit in items]
+
+def projected_decode(backend):
+    return lambda body: catalog_decoder.decode_list_items(body, backend=backend)
+
+def time_decoder(decode, bodies, repeat):
+    best = float('inf')
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = sum(len(decode(body)) for body in bodies)
+        best = min(best, time.perf_counter() - start)
+    return best, items
+
+archive_dir = sys.argv[1] if len(sys.argv) > 1 else archive.ARCHIVE_DIR
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+bodies = [record["body"].encode('utf-8') for record in archive.iter_records(archive_dir)]
+if not bodies:
+    print(f"❌ No archived pages found in {archive_dir}. Run a scrape first.")
+    sys.exit(1)
+
+total_mb = sum(len(body) for body in bodies) / 1024 / 1024
+
+print("🧪 Catalog decode benchmark")
+print("=" * 50)
+print(f"Pages: {len(bodies)} ({total_mb:.1f} MB), best of {repeat}")
+
+decoders = [("json + dict (legacy)", legacy_decode)]
+decoders.append(("projected json", projected_decode("json")))
+if catalog_decoder.orjson is not None:
+    decoders.append(("projected orjson", projected_decode("orjson")))
+if catalog_decoder.msgspec is not None:
+    decoders.append(("projected msgspec", projected_decode("msgspec")))
+
+baseline = None
+for name, decode in decoders:
+    elapsed, items = time_decoder(decode, bodies, repeat)
+    baseline = baseline or elapsed
+    print(f"\n{name}")
+    print(f"  Time: {elapsed*1000:.1f}ms ({len(bodies)/elapsed:.0f} pages/s, {total_mb/elapsed:.1f} MB/s)")
+    print(f"  Items: {items}")
+    print(f"  Speedup: {baseline/elapsed:.2f}x")
+
+print("\n✅ Benchmark complete!")
@@ -0,0 +1,99 @@
+"""
+Schema-projected decoding of Daraz catalog responses.
+Only the `mods.listItems` fields the scraper uses are decoded, into compact
+records, using the fastest JSON library that is installed:
+
+    msgspec  - decodes straight into typed structs and skips every other field
+    orjson   - fast full decode, projected into records afterwards
+    json     - standard library fallback
+"""
+
+import json
+from collections import namedtuple
+from typing import List, Optional, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Field names follow the Daraz response so every backend yields the same records
+FIELDS = ["name", "brandName", "price", "ratingScore", "review", "productUrl", "image", "itemId"]
+FIELD_DEFAULTS = {"productUrl": "", "image": ""}
+
+ListItem = namedtuple("ListItem", FIELDS)
+
+if msgspec is not None:
+    Scalar = Union[str, int, float, None]
+
+    class _Item(msgspec.Struct):
+        name: Scalar = None
+        brandName: Scalar = None
+        price: Scalar = None
+        ratingScore: Scalar = None
+        review: Scalar = None
+        productUrl: Scalar = ""
+        image: Scalar = ""
+        itemId: Scalar = None
+
+    class _Mods(msgspec.Struct):
+        listItems: Optional[List[_Item]] = None
+
+    class _Page(msgspec.Struct):
+        mods: Optional[_Mods] = None
+
+    _decoder = msgspec.json.Decoder(_Page)
+
+BACKEND = "msgspec" if msgspec is not None else "orjson" if orjson is not None else "json"
+
+
+def _loads(body):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _project(data):
+    mods = data.get("mods") or {}
+    items = mods.get("listItems") or []
+    return [ListItem(*(hit.get(field, FIELD_DEFAULTS.get(field)) for field in FIELDS)) for hit in items]
+
+
+def decode_list_items(body, backend=None):
+    """
+    Decode the listItems of a catalog response into ListItem-like records.
+
+    Records expose the Daraz field names as attributes (item.name,
+    item.productUrl, ...). A page whose shape does not match the schema
+    falls back to a full decode, so unexpected field types never lose data.
+
+    Args:
+        body (str or bytes): Raw catalog JSON
+        backend (str): Force "msgspec", "orjson" or "json" (default: fastest installed)
+
+    Returns:
+        list: Decoded items
+
+    Raises:
+        ValueError: If the body is not valid JSON
+    """
+    backend = backend or BACKEND
+
+    if backend == "msgspec":
+        try:
+            page = _decoder.decode(body)
+        except msgspec.ValidationError:
+            return _project(_loads(body))
+        if page.mods is None or page.mods.listItems is None:
+            return []
+        return page.mods.listItems
+
+    if backend == "orjson":
+        return _project(orjson.loads(body))
+
+    return _project(json.loads(body))
@@ -14,6 +14,30 @@ from plotly.subplots import make_subplots
 import json
 import os
 
+import tables
+
+# Numeric specs from preprocess (specs.py) that join the clustering features
+# when the input has them
+SPEC_FEATURES = ["screen_in", "cpu_gen", "refresh_hz", "dedicated_gpu", "ssd"]
+
+def add_spec_features(df):
+    """
+    Derive numeric clustering features from the extracted specs.
+    
+    Args:
+        df: Processed dataframe
+    
+    Returns:
+        List of spec feature columns present in the dataframe
+    """
+    if "gpu" in df:
+        df["dedicated_gpu"] = df["gpu"].str.match(r"rtx|gtx|mx|radeonrx|arc", na=False).astype(int)
+    if "storage_type" in df:
+        df["ssd"] = (df["storage_type"] == "ssd").astype(int)
+    spec_features = [col for col in SPEC_FEATURES if col in df]
+    df[spec_features] = df[spec_features].fillna(0)
+    return spec_features
+
 def perform_clustering(X_scaled, df, n_clusters=5):
     """
     Perform K-Means and DBSCAN clustering on scaled features.
@@ -196,8 +220,9 @@ def run(input_file="processed_products.csv"):
     os.makedirs('static/plots', exist_ok=True)
     
     # Load data
-    df = pd.read_csv(input_file)
+    df = tables.read(input_file, "processed")
     print(f"Loaded {len(df)} products")
+    tables.memory_report(df, "processed")
     
     # Fill missing numeric values
     df["ram_gb"] = df["ram_gb"].fillna(0)
@@ -207,7 +232,7 @@ def run(input_file="processed_products.csv"):
     df["price"] = df["price"].fillna(0)
     
     # Prepare features
-    features = ["price", "ram_gb", "storage_gb", "rating", "reviews"]
+    features = ["price", "ram_gb", "storage_gb", "rating", "reviews"] + add_spec_features(df)
     X = df[features]
     X_scaled = StandardScaler().fit_transform(X)
     
@@ -329,7 +354,8 @@ def run(input_file="processed_products.csv"):
     plots["price_distribution"] = "static/plots/price_distribution.html"
     
     # Save enhanced dataframe
-    df.to_csv('processed_products_enhanced.csv', index=False)
+    df = tables.write(df, 'processed_products_enhanced.csv', "enhanced")
+    tables.memory_report(df, "enhanced")
     print(f"✅ Enhanced CSV saved with clustering data")
     
     # Save statistics
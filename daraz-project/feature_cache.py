@@ -0,0 +1,93 @@
+"""
+Persistent cache of title features for preprocessing.
+Extracted features are stored by a hash of the normalized title, so titles
+seen on earlier runs are looked up instead of parsed again. Entries carry
+the extractor version and are ignored once the extractors change.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+FEATURE_CACHE_FILE = "feature_cache.parquet"
+
+class FeatureCache:
+    """On-disk title -> features table"""
+
+    def __init__(self, path=FEATURE_CACHE_FILE, version=1):
+        """
+        Args:
+            path (str): Parquet file the cache is kept in
+            version (int): Extractor version; entries of other versions are ignored
+        """
+        self.path = path
+        self.version = version
+        self.stats = {"hits": 0, "misses": 0}
+        self.table = pd.DataFrame()
+        self._dirty = False
+
+        if os.path.exists(path):
+            try:
+                table = pd.read_parquet(path)
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable feature cache {path}: {e}")
+            else:
+                table = table[table["version"] == version].drop(columns="version")
+                self.table = table.set_index("key")
+
+    @staticmethod
+    def normalize(titles):
+        """Case and surrounding whitespace never change the extracted features"""
+        text = titles.astype(object).where(titles.notna(), "nan").map(str)
+        return text.str.strip().str.lower()
+
+    @staticmethod
+    def keys(normalized):
+        return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+    def lookup(self, titles, extract):
+        """
+        Features for every title, extracting only the titles not cached yet.
+
+        Args:
+            titles (Series): Product titles
+            extract (callable): Builds a features DataFrame from a Series of titles
+
+        Returns:
+            DataFrame: Features aligned with `titles`
+        """
+        normalized = self.normalize(titles)
+        keys = self.keys(normalized)
+        known = np.isin(keys, self.table.index.to_numpy()) if len(self.table) else np.zeros(len(keys), bool)
+        self.stats["hits"] += int(known.sum())
+        self.stats["misses"] += int((~known).sum())
+
+        if not known.all():
+            miss_keys = keys[~known]
+            # Each new title is extracted once, however often it repeats
+            miss_keys, first = np.unique(miss_keys, return_index=True)
+            fresh = extract(normalized[~known].iloc[first].reset_index(drop=True))
+            fresh.index = pd.Index(miss_keys, name="key")
+            self.table = fresh if self.table.empty else pd.concat([self.table, fresh])
+            self._dirty = True
+
+        features = self.table.reindex(keys)
+        features.index = titles.index
+        return features
+
+    @property
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def save(self):
+        """Write new entries back to disk"""
+        if not self._dirty:
+            return
+        table = self.table.reset_index()
+        table["version"] = self.version
+        tmp_file = self.path + ".tmp"
+        table.to_parquet(tmp_file, index=False)
+        os.replace(tmp_file, self.path)
+        self._dirty = False
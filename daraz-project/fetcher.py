@@ -0,0 +1,276 @@
+"""
+Concurrent fetch engine for the Daraz scraper.
+Keeps a bounded number of requests in flight, paces them with a token bucket
+and backs off adaptively when a host starts throttling us.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+class RetryableError(Exception):
+    """Raised by a fetch function for failures worth retrying"""
+
+    def __init__(self, message, throttled=False, retry_after=None):
+        """
+        Args:
+            message (str): Description of the failure
+            throttled (bool): The server asked us to slow down (429/503)
+            retry_after (float): Seconds the server asked us to wait, if any
+        """
+        super().__init__(message)
+        self.throttled = throttled
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) to seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Token-bucket politeness limiter shared by all fetch workers"""
+
+    def __init__(self, rate=2.0, burst=2, min_rate=0.1):
+        """
+        Args:
+            rate (float): Tokens (requests) added per second
+            burst (int): Maximum number of requests allowed back to back
+            min_rate (float): Floor the rate can be slowed down to
+        """
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # A thread lock keeps the bucket usable across event loops and threads
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token, returning how many seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self):
+        """Wait until a token is available and consume it"""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def slow_down(self, factor=0.5):
+        """Cut the rate multiplicatively after the host throttled us"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * factor)
+
+    def speed_up(self, step=0.1):
+        """Recover the rate additively after a successful request"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + step)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter that honors Retry-After"""
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=60.0):
+        """
+        Args:
+            max_attempts (int): Attempts per item before it is dead-lettered
+            base_delay (float): Backoff for the first retry in seconds
+            max_delay (float): Upper bound on any single backoff
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (0-based)"""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            backoff = max(backoff, min(retry_after, self.max_delay))
+        return backoff
+
+
+class CircuitBreaker:
+    """Per-host breaker that pauses all requests to a host while it throttles us"""
+
+    def __init__(self, threshold=3, cooldown=5.0, max_cooldown=300.0):
+        """
+        Args:
+            threshold (int): Consecutive throttles/failures that open the breaker
+            cooldown (float): First pause in seconds; doubles on every re-open
+            max_cooldown (float): Upper bound on a single pause
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self._lock = threading.Lock()
+
+    async def wait(self):
+        """Sleep while the breaker is open"""
+        while True:
+            with self._lock:
+                remaining = self.open_until - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.trips = 0
+
+    def record_failure(self, retry_after=None):
+        """
+        Count a failure, opening the breaker once the threshold is reached.
+
+        A Retry-After always pauses the host for at least that long. Failures
+        of requests that were already in flight while the breaker was open do
+        not count towards the next trip.
+
+        Returns:
+            bool: True if this failure tripped the breaker
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self.open_until:
+                if retry_after is not None:
+                    self.open_until = max(self.open_until, now + retry_after)
+                return False
+
+            self.failures += 1
+            if self.failures < self.threshold:
+                if retry_after is not None:
+                    self.open_until = now + retry_after
+                return False
+
+            pause = min(self.max_cooldown, self.cooldown * 2 ** self.trips)
+            if retry_after is not None:
+                pause = max(pause, retry_after)
+            self.open_until = now + pause
+            self.trips += 1
+            self.failures = 0
+            return True
+
+
+async def _run(next_item, limiter_for, breaker_for, fetch, concurrency, on_result, policy, stats):
+    loop = asyncio.get_running_loop()
+    dead_letters = []
+
+    async def fetch_with_retries(executor, item):
+        limiter = limiter_for(item)
+        breaker = breaker_for(item)
+        for attempt in range(policy.max_attempts):
+            await breaker.wait()
+            await limiter.acquire()
+            try:
+                result = await loop.run_in_executor(executor, fetch, item)
+            except RetryableError as e:
+                if e.throttled:
+                    stats["throttled"] += 1
+                    limiter.slow_down()
+                if breaker.record_failure(e.retry_after):
+                    stats["breaker_trips"] += 1
+                    print(f"🛑 Circuit open, pausing requests to this host ({e})")
+                if attempt + 1 == policy.max_attempts:
+                    break
+                stats["retries"] += 1
+                await asyncio.sleep(policy.delay(attempt, e.retry_after))
+                continue
+            except Exception as e:
+                print(f"❌ Fetch failed for {item}: {e}")
+                return None
+
+            breaker.record_success()
+            limiter.speed_up()
+            return result
+
+        dead_letters.append(item)
+        return None
+
+    async def worker(executor):
+        while True:
+            item = next_item()
+            if item is None:
+                return
+            on_result(item, await fetch_with_retries(executor, item))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        await asyncio.gather(*(worker(executor) for _ in range(concurrency)))
+
+    return dead_letters
+
+
+def _new_stats():
+    return {"retries": 0, "throttled": 0, "breaker_trips": 0, "dead_letters": 0, "recovered": 0}
+
+
+def crawl(frontier, fetch, concurrency=4, on_result=None, policy=None):
+    """
+    Drain a CrawlFrontier, pacing each request with its host's limiter.
+
+    Work added to the frontier while the crawl is running is picked up by
+    the same workers. Throttled or failing requests are retried with
+    exponential backoff, and a per-host circuit breaker pauses the whole
+    host while it keeps throttling. Pages that exhaust their retries are
+    reported as failed, kept on a dead-letter list and re-queued once at
+    the end of the crawl.
+
+    Args:
+        frontier (CrawlFrontier): Source of work items
+        fetch (callable): Blocking function called as fetch(item)
+        concurrency (int): Maximum number of fetches in flight
+        on_result (callable): Called as on_result(item, result) as each fetch completes
+        policy (RetryPolicy): Retry and backoff settings
+
+    Returns:
+        dict: Retry, throttling and dead-letter counters for the crawl
+    """
+    policy = policy or RetryPolicy()
+    stats = _new_stats()
+    handle = on_result or (lambda item, result: None)
+
+    def run():
+        return asyncio.run(_run(
+            frontier.pop,
+            frontier.limiter_for,
+            frontier.breaker_for,
+            fetch,
+            concurrency,
+            handle,
+            policy,
+            stats
+        ))
+
+    dead_letters = run()
+    stats["dead_letters"] = len(dead_letters)
+    if dead_letters:
+        print(f"🔁 Retrying {len(dead_letters)} dead-lettered pages")
+        frontier.requeue(dead_letters)
+        stats["recovered"] = len(dead_letters) - len(run())
+
+    return stats
@@ -0,0 +1,118 @@
+"""
+Crawl frontier for multi-term Daraz scrapes.
+A priority queue of (term, page) work items with global URL dedup and one
+politeness limiter and circuit breaker per host, so many search terms can
+share a single crawl.
+"""
+
+import heapq
+import itertools
+import threading
+from collections import namedtuple
+from urllib.parse import quote_plus, urlparse
+
+from fetcher import CircuitBreaker, TokenBucket
+
+CrawlItem = namedtuple("CrawlItem", ["seq", "term", "page", "url", "priority"])
+
+class CrawlFrontier:
+    """Thread-safe priority queue of catalog pages to fetch"""
+
+    def __init__(self, catalog_url, max_pages=5, rate=2.0, burst=2, host_rates=None, done=None):
+        """
+        Args:
+            catalog_url (str): Catalog endpoint search URLs are built from
+            max_pages (int): Default number of pages crawled per term
+            rate (float): Default requests per second allowed per host
+            burst (int): Requests allowed back to back per host
+            host_rates (dict): Per-host overrides of `rate`, keyed by hostname
+            done (dict): term -> pages already crawled (e.g. from a checkpoint)
+        """
+        self.catalog_url = catalog_url
+        self.max_pages = max_pages
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = host_rates or {}
+        self.done = {term: set(pages) for term, pages in (done or {}).items()}
+
+        self.closed = False
+        self._heap = []
+        self._order = itertools.count()
+        self._seq = itertools.count()
+        self._seen_urls = set()
+        # term -> first page that came back empty
+        self._exhausted = {}
+        self._limiters = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def url_for(self, term, page):
+        return f"{self.catalog_url}?q={quote_plus(term)}&page={page}&ajax=true"
+
+    def add_term(self, term, priority=0, max_pages=None):
+        """
+        Queue pages 1..max_pages of a search term.
+
+        Lower priority values are crawled first; within a priority, pages are
+        interleaved across terms so every term makes progress.
+
+        Returns:
+            int: Number of new pages queued, or None once the crawl has finished
+        """
+        term = " ".join(str(term).split()).lower()
+        if not term:
+            return 0
+
+        added = 0
+        with self._lock:
+            if self.closed:
+                return None
+            self._exhausted.pop(term, None)
+            already_done = self.done.get(term, set())
+            for page in range(1, (max_pages or self.max_pages) + 1):
+                url = self.url_for(term, page)
+                if url in self._seen_urls or page in already_done:
+                    continue
+                self._seen_urls.add(url)
+                heapq.heappush(self._heap, (priority, page, next(self._order), term, url))
+                added += 1
+        return added
+
+    def pop(self):
+        """Return the next CrawlItem, or None (and close) when nothing is left"""
+        with self._lock:
+            while self._heap:
+                priority, page, _, term, url = heapq.heappop(self._heap)
+                if page > self._exhausted.get(term, page):
+                    continue
+                return CrawlItem(next(self._seq), term, page, url, priority)
+            self.closed = True
+            return None
+
+    def exhaust(self, term, page):
+        """Drop the pages of a term after `page`, where its results ran out"""
+        with self._lock:
+            self._exhausted[term] = min(page, self._exhausted.get(term, page))
+
+    def requeue(self, items):
+        """Put failed items back (and reopen the frontier) for another attempt"""
+        with self._lock:
+            self.closed = False
+            for item in items:
+                heapq.heappush(self._heap, (item.priority, item.page, next(self._order), item.term, item.url))
+
+    def limiter_for(self, item):
+        """Per-host token bucket shared by every term crawled on that host"""
+        host = urlparse(item.url).hostname
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = TokenBucket(rate=self.host_rates.get(host, self.rate), burst=self.burst)
+            return self._limiters[host]
+
+    def breaker_for(self, item):
+        """Per-host circuit breaker that pauses every term crawled on that host"""
+        host = urlparse(item.url).hostname
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker()
+            return self._breakers[host]
@@ -0,0 +1,170 @@
+"""
+SQLite backend for the price history.
+An alternative to the partitioned Parquet store in price_history.py for when
+single products are looked up often: observations live in one embedded
+database with a unique index on (product_id, timestamp), so the timeline of
+a product is an index range scan instead of a file scan.
+"""
+
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+
+import price_history
+
+HISTORY_DB = "price_history.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_history (
+    timestamp TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    title TEXT,
+    price REAL,
+    rating REAL,
+    brand TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_price_history_product_time
+    ON price_history (product_id, timestamp);
+"""
+
+def connect(db_file=HISTORY_DB):
+    """Open the database, creating the table and index if needed"""
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.executescript(SCHEMA)
+    return conn
+
+def exists(db_file=HISTORY_DB):
+    """Whether any history has been recorded"""
+    if not os.path.exists(db_file):
+        return False
+    with closing(connect(db_file)) as conn:
+        return conn.execute("SELECT 1 FROM price_history LIMIT 1").fetchone() is not None
+
+def _iso(timestamp):
+    # Fixed-width ISO strings sort in time order, which the index relies on
+    return price_history.local_time(timestamp).isoformat(sep=' ', timespec='microseconds')
+
+def append(products, db_file=HISTORY_DB, timestamp=None, key=None):
+    """
+    Insert one batch of price observations.
+
+    Re-inserting a product at the same timestamp replaces the earlier row,
+    so no separate compaction step is needed.
+
+    Args:
+        products (list): Scraped product rows
+        db_file (str): SQLite database path
+        timestamp (datetime): Observation time shared by the whole batch
+        key (callable): Derives a product id from a row lacking one
+
+    Returns:
+        DataFrame: The rows that were inserted
+    """
+    timestamp = timestamp or datetime.now()
+    batch = price_history.to_batch(products, timestamp, key).dropna(subset=['product_id'])
+    if batch.empty:
+        return batch
+
+    rows = batch.astype(object).where(batch.notna(), None)
+    rows['timestamp'] = _iso(timestamp)
+    with closing(connect(db_file)) as conn, conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO price_history (timestamp, product_id, title, price, rating, brand) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows[price_history.HISTORY_COLUMNS].itertuples(index=False, name=None)
+        )
+    return batch
+
+def price_changes(db_file=HISTORY_DB):
+    """
+    Compare the last two observed prices of every product.
+
+    Args:
+        db_file (str): SQLite database path
+
+    Returns:
+        list: Price changes, largest relative change first
+    """
+    if not os.path.exists(db_file):
+        return []
+
+    with closing(connect(db_file)) as conn:
+        df = pd.read_sql_query("""
+            SELECT product_id, timestamp, title, price FROM (
+                SELECT product_id, timestamp, title, price,
+                       ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY timestamp DESC) AS recency
+                FROM price_history
+            )
+            WHERE recency <= 2
+            ORDER BY product_id, timestamp
+        """, conn)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return price_history.changes_between_last_two(df)
+
+def last_prices(product_ids, db_file=HISTORY_DB):
+    """
+    Last known price of each of the given products, read from the index.
+
+    Args:
+        product_ids (list): Product keys to look up
+        db_file (str): SQLite database path
+
+    Returns:
+        Series: Price by product id; products never seen before are absent
+    """
+    product_ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+    if not product_ids or not os.path.exists(db_file):
+        return pd.Series(dtype=float, name='price')
+
+    rows = []
+    with closing(connect(db_file)) as conn:
+        # Stay well under SQLite's limit on bound parameters
+        for i in range(0, len(product_ids), 500):
+            chunk = product_ids[i:i + 500]
+            rows += conn.execute(f"""
+                SELECT p.product_id, p.price
+                FROM price_history p
+                JOIN (
+                    SELECT product_id, MAX(timestamp) AS timestamp
+                    FROM price_history
+                    WHERE product_id IN ({", ".join("?" * len(chunk))})
+                    GROUP BY product_id
+                ) last USING (product_id, timestamp)
+            """, chunk).fetchall()
+    return pd.Series(dict(rows), dtype=float, name='price')
+
+def product_history(product_id, db_file=HISTORY_DB, start=None, end=None):
+    """
+    Price timeline of one product, read from the (product_id, timestamp) index.
+
+    Args:
+        product_id (str): Product key, e.g. "i123456"
+        db_file (str): SQLite database path
+        start (datetime or str): Earliest observation time to include
+        end (datetime or str): Latest observation time to include
+
+    Returns:
+        list: Observations (timestamp, title, price, rating) oldest first
+    """
+    if not os.path.exists(db_file):
+        return []
+
+    query = "SELECT timestamp, title, price, rating FROM price_history WHERE product_id = ?"
+    params = [product_id]
+    if start is not None:
+        query += " AND timestamp >= ?"
+        params.append(_iso(start))
+    if end is not None:
+        query += " AND timestamp <= ?"
+        params.append(_iso(end))
+    query += " ORDER BY timestamp"
+
+    with closing(connect(db_file)) as conn:
+        rows = conn.execute(query, params).fetchall()
+    return [
+        {"timestamp": pd.Timestamp(ts), "title": title, "price": price, "rating": rating}
+        for ts, title, price, rating in rows
+    ]
@@ -0,0 +1,101 @@
+"""
+Shared HTTP session layer for the Daraz scraper.
+Catalog requests and image downloads reuse one pooled keep-alive session,
+so each host only pays the TCP+TLS handshake once per pooled connection.
+"""
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connections kept alive per host unless overridden in HOST_POOL_SIZES
+DEFAULT_POOL_SIZE = 16
+
+# Per-host pool sizes, keyed by scheme + host
+HOST_POOL_SIZES = {
+    "https://www.daraz.pk": 8,
+    "https://static-01.daraz.pk": 32,
+    "https://img.drz.lazcdn.com": 32
+}
+
+_session = None
+_lock = threading.Lock()
+
+def _build_session(default_pool_size, host_pool_sizes):
+    session = requests.Session()
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive"
+    })
+
+    default_adapter = HTTPAdapter(pool_connections=len(host_pool_sizes) + 4, pool_maxsize=default_pool_size)
+    session.mount("http://", default_adapter)
+    session.mount("https://", default_adapter)
+
+    for prefix, size in host_pool_sizes.items():
+        session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=size))
+
+    return session
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use"""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _build_session(DEFAULT_POOL_SIZE, HOST_POOL_SIZES)
+        return _session
+
+def configure(default_pool_size=None, host_pool_sizes=None):
+    """
+    Rebuild the shared session with new pool sizes.
+
+    Args:
+        default_pool_size (int): Connections kept per host without an explicit size
+        host_pool_sizes (dict): Mapping of "scheme://host" -> pool size
+    """
+    global _session, DEFAULT_POOL_SIZE, HOST_POOL_SIZES
+    with _lock:
+        if default_pool_size is not None:
+            DEFAULT_POOL_SIZE = default_pool_size
+        if host_pool_sizes is not None:
+            HOST_POOL_SIZES = dict(host_pool_sizes)
+        if _session is not None:
+            _session.close()
+        _session = _build_session(DEFAULT_POOL_SIZE, HOST_POOL_SIZES)
+
+def pool_stats():
+    """
+    Report connection reuse for every host the session has talked to.
+
+    A hit is a request served on an already open keep-alive connection,
+    a miss is a request that had to open a new connection.
+
+    Returns:
+        dict: Per-host hit/miss counters plus totals
+    """
+    with _lock:
+        session = _session
+
+    hosts = {}
+    if session is not None:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{pool.scheme}://{pool.host}"
+                entry = hosts.setdefault(host, {"requests": 0, "hits": 0, "misses": 0})
+                entry["requests"] += pool.num_requests
+                entry["misses"] += pool.num_connections
+                entry["hits"] += max(pool.num_requests - pool.num_connections, 0)
+
+    total_requests = sum(h["requests"] for h in hosts.values())
+    total_hits = sum(h["hits"] for h in hosts.values())
+    return {
+        "hosts": hosts,
+        "requests": total_requests,
+        "hits": total_hits,
+        "misses": sum(h["misses"] for h in hosts.values()),
+        "hit_rate": total_hits / total_requests if total_requests else 0.0
+    }
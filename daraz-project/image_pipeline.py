@@ -0,0 +1,161 @@
+"""
+Background image download pipeline for the Daraz scraper.
+Images are queued while pages are parsed and downloaded by a separate worker
+pool, so a slow CDN never holds up the catalog crawl.
+"""
+
+import hashlib
+import os
+import queue
+import threading
+
+import pandas as pd
+
+_STOP = object()
+
+class ImageDownloader:
+    """Bounded queue plus worker pool that downloads product images"""
+
+    def __init__(self, download, images_dir="static/images", workers=8, max_queue=2000,
+                 byte_budget=500 * 1024 * 1024, max_image_bytes=5 * 1024 * 1024, timeout=10):
+        """
+        Args:
+            download (callable): download(url, product_id, images_dir, timeout, max_bytes)
+                returning (local_path or None, bytes_written)
+            images_dir (str): Directory images are saved to
+            workers (int): Number of download threads
+            max_queue (int): Maximum number of queued downloads; extra images are skipped
+            byte_budget (int): Total bytes the run may download before new images are skipped
+            max_image_bytes (int): Images larger than this are abandoned
+            timeout (float): Per-image time limit in seconds
+        """
+        self.download = download
+        self.images_dir = images_dir
+        self.byte_budget = byte_budget
+        self.max_image_bytes = max_image_bytes
+        self.timeout = timeout
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.results = {}
+        self.seen = set()
+        self.stats = {"queued": 0, "duplicates": 0, "dropped": 0, "downloaded": 0,
+                      "failed": 0, "over_budget": 0, "bytes": 0}
+        self._lock = threading.Lock()
+
+        self.workers = [threading.Thread(target=self._worker, name=f"image-worker-{i}")
+                        for i in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    @staticmethod
+    def url_hash(url):
+        return hashlib.md5(url.encode()).hexdigest()
+
+    def submit(self, url, product_id):
+        """Queue an image without blocking; repeated URLs are only fetched once"""
+        key = self.url_hash(url)
+        with self._lock:
+            if key in self.seen:
+                self.stats["duplicates"] += 1
+                return
+            self.seen.add(key)
+
+        try:
+            self.queue.put_nowait((key, url, product_id))
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+            return
+
+        with self._lock:
+            self.stats["queued"] += 1
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                return
+
+            key, url, product_id = job
+            with self._lock:
+                remaining = self.byte_budget - self.stats["bytes"]
+            if remaining <= 0:
+                with self._lock:
+                    self.stats["over_budget"] += 1
+                continue
+
+            path, size = self.download(url, product_id, self.images_dir, timeout=self.timeout,
+                                       max_bytes=min(self.max_image_bytes, remaining))
+            with self._lock:
+                if path:
+                    self.results[key] = path
+                    self.stats["downloaded"] += 1
+                    self.stats["bytes"] += size
+                else:
+                    self.stats["failed"] += 1
+
+    @staticmethod
+    def _identity(path):
+        """Changes whenever the file is rewritten, replaced or appended to"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def lookup(self, url):
+        """Return the local path of a finished download, or an empty string"""
+        return self.results.get(self.url_hash(url), "") if url else ""
+
+    def close(self):
+        """Wait for queued downloads to finish and stop the workers"""
+        for _ in self.workers:
+            self.queue.put(_STOP)
+        for worker in self.workers:
+            worker.join()
+
+    def backfill(self, out_file, chunksize=50000):
+        """
+        Fill the local_image column of a scraped CSV with finished downloads.
+
+        The file is left alone if it changed while it was being back-filled,
+        e.g. because a newer crawl started writing to it.
+        """
+        identity = self._identity(out_file)
+        if identity is None or identity[1] == 0:
+            return 0
+
+        # Rewrite chunk by chunk so back-filling stays flat in memory
+        tmp_file = out_file + ".tmp"
+        filled = 0
+        first = True
+        for chunk in pd.read_csv(out_file, chunksize=chunksize):
+            if "image_url" in chunk.columns:
+                local = chunk["image_url"].fillna("").map(self.lookup)
+                chunk["local_image"] = local.where(local != "", chunk["local_image"].fillna(""))
+                filled += int((local != "").sum())
+            chunk.to_csv(tmp_file, mode='w' if first else 'a', header=first, index=False)
+            first = False
+
+        if first:
+            return 0
+        if self._identity(out_file) != identity:
+            os.remove(tmp_file)
+            print(f"⚠️ {out_file} changed while images were back-filled; left as it is")
+            return 0
+        os.replace(tmp_file, out_file)
+        return filled
+
+    def finish_in_background(self, out_file):
+        """Drain the queue and back-fill `out_file` on a separate thread"""
+        def finish():
+            self.close()
+            filled = self.backfill(out_file)
+            s = self.stats
+            print(f"🖼️ Images done: {s['downloaded']} downloaded, {s['duplicates']} duplicates, "
+                  f"{s['failed']} failed, {s['dropped'] + s['over_budget']} skipped "
+                  f"({s['bytes'] / 1024 / 1024:.1f} MB); back-filled {filled} rows in {out_file}")
+
+        thread = threading.Thread(target=finish, name="image-backfill")
+        thread.start()
+        return thread
@@ -0,0 +1,180 @@
+"""
+Content-addressed product image store.
+Images are saved under the SHA-256 of their bytes, so an image shared by many
+products or seen again on later runs is stored once. A small append-only
+index remembers which URL produced which file, so known images are not
+downloaded again, and thumbnails for the dashboard are generated on a
+background pool.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+IMAGES_DIR = "static/images"
+THUMBS_SUBDIR = "thumbs"
+THUMB_SIZE = 320
+INDEX_FILE = "index.jsonl"
+
+# Leading bytes -> file extension, for the formats Daraz serves
+_SIGNATURES = [
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF8", ".gif"),
+]
+
+def _extension(head):
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return ".jpg"
+
+def is_content_addressed(filename):
+    """Whether a stored file is named by its content hash (and so never changes)"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return len(stem) == 64 and all(c in "0123456789abcdef" for c in stem)
+
+class ImageStore:
+    """Deduplicating image directory with background thumbnailing"""
+
+    def __init__(self, images_dir=IMAGES_DIR, thumb_size=THUMB_SIZE, workers=2):
+        """
+        Args:
+            images_dir (str): Directory images are saved to and served from
+            thumb_size (int): Longest side of generated thumbnails in pixels
+            workers (int): Threads generating thumbnails
+        """
+        self.images_dir = images_dir
+        self.thumbs_dir = os.path.join(images_dir, THUMBS_SUBDIR)
+        self.thumb_size = thumb_size
+        self.index_file = os.path.join(images_dir, INDEX_FILE)
+        self.stats = {"stored": 0, "deduplicated": 0, "thumbnails": 0}
+        os.makedirs(self.thumbs_dir, exist_ok=True)
+
+        # url -> stored filename
+        self.urls = {}
+        self._index_offset = 0
+        self._lock = threading.Lock()
+        self._read_index()
+        self._thumbnailer = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+
+    def _read_index(self):
+        """Pick up index entries appended since the last read, e.g. by another process"""
+        with self._lock:
+            if not os.path.exists(self.index_file) or os.path.getsize(self.index_file) <= self._index_offset:
+                return
+            with open(self.index_file, 'rb') as f:
+                f.seek(self._index_offset)
+                lines = f.read().split(b"\n")
+            # A partly written last line is read again next time
+            self._index_offset += sum(len(line) + 1 for line in lines[:-1])
+            for line in lines[:-1]:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.urls[entry["url"]] = entry["file"]
+
+    def lookup(self, url):
+        """Served path of an image already downloaded from `url`, or None"""
+        if url not in self.urls:
+            self._read_index()
+        filename = self.urls.get(url)
+        if filename and os.path.exists(os.path.join(self.images_dir, filename)):
+            return f"/images/{filename}"
+        return None
+
+    def temp_file(self):
+        """Open a uniquely named partial file to download into"""
+        fd, path = tempfile.mkstemp(suffix=".part", dir=self.images_dir)
+        return os.fdopen(fd, 'wb'), path
+
+    def commit(self, tmp_path, digest, url, head):
+        """
+        Move a finished download into the store under its content hash.
+
+        Args:
+            tmp_path (str): Partial file returned by temp_file()
+            digest (str): SHA-256 hex digest of the file's bytes
+            url (str): Source URL, remembered so it is not downloaded again
+            head (bytes): First bytes of the file, used to pick its extension
+
+        Returns:
+            str: Served path of the stored image
+        """
+        filename = digest + _extension(head)
+        path = os.path.join(self.images_dir, filename)
+
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                self.stats["deduplicated"] += 1
+                new = False
+            else:
+                os.replace(tmp_path, path)
+                self.stats["stored"] += 1
+                new = True
+
+            if self.urls.get(url) != filename:
+                self.urls[url] = filename
+                with open(self.index_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({"url": url, "file": filename}) + "\n")
+
+        if new:
+            self._thumbnailer.submit(self._make_thumbnail, filename)
+        return f"/images/{filename}"
+
+    def thumbnail_path(self, filename):
+        return os.path.join(self.thumbs_dir, os.path.splitext(filename)[0] + ".jpg")
+
+    def thumbnail(self, filename):
+        """
+        Path of an image's thumbnail, made now if the background pool has
+        not got to it yet.
+
+        Returns:
+            str: Thumbnail path, or None if it cannot be made (e.g. without Pillow)
+        """
+        self._make_thumbnail(filename)
+        target = self.thumbnail_path(filename)
+        return target if os.path.exists(target) else None
+
+    def _make_thumbnail(self, filename):
+        if Image is None:
+            return
+        target = self.thumbnail_path(filename)
+        if os.path.exists(target):
+            return
+        try:
+            os.makedirs(self.thumbs_dir, exist_ok=True)
+            with Image.open(os.path.join(self.images_dir, filename)) as image:
+                image.thumbnail((self.thumb_size, self.thumb_size))
+                # Unique, as a request and the background pool may make the same thumbnail
+                tmp_path = f"{target}.{uuid.uuid4().hex}.part"
+                image.convert("RGB").save(tmp_path, "JPEG", quality=85, optimize=True)
+            os.replace(tmp_path, target)
+            with self._lock:
+                self.stats["thumbnails"] += 1
+        except Exception as e:
+            print(f"Failed to create thumbnail for {filename}: {e}")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(images_dir=IMAGES_DIR):
+    """Shared ImageStore for a directory"""
+    with _stores_lock:
+        if images_dir not in _stores:
+            _stores[images_dir] = ImageStore(images_dir)
+        return _stores[images_dir]
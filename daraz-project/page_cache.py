@@ -0,0 +1,88 @@
+"""
+Persistent per-URL catalog page cache.
+Stores the validators (ETag / Last-Modified), a hash of the response body and
+the parsed rows of every catalog page, so unchanged pages are neither
+re-downloaded nor re-parsed on the next scrape.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+class PageCache:
+    """On-disk cache of catalog pages keyed by URL"""
+
+    def __init__(self, cache_dir="page_cache", version=1):
+        """
+        Args:
+            cache_dir (str): Directory cache entries are stored in
+            version (int): Row format version; entries written with another
+                version are ignored
+        """
+        self.cache_dir = cache_dir
+        self.version = version
+        self.stats = {"not_modified": 0, "same_body": 0, "misses": 0}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode()).hexdigest() + ".json")
+
+    @staticmethod
+    def body_hash(body):
+        return hashlib.sha256(body).hexdigest()
+
+    def get(self, url):
+        """Return the cache entry for a URL, or None"""
+        path = self._path(url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("version") == self.version else None
+
+    def conditional_headers(self, entry):
+        """Build If-None-Match / If-Modified-Since headers from a cache entry"""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, response, body_hash, rows):
+        """Store validators, body hash and parsed rows for a URL"""
+        entry = {
+            "version": self.version,
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "body_hash": body_hash,
+            "fetched_at": datetime.now().isoformat(),
+            "rows": rows
+        }
+        path = self._path(url)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def reuse(self, entry, reason):
+        """Return the cached rows of an unchanged page, stamped with the current time"""
+        with self._lock:
+            self.stats[reason] += 1
+        now = datetime.now().isoformat()
+        rows = entry["rows"]
+        for row in rows:
+            row["scraped_at"] = now
+        return rows
+
+    def miss(self):
+        with self._lock:
+            self.stats["misses"] += 1
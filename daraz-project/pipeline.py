@@ -0,0 +1,161 @@
+"""
+Content-hash cached processing pipeline: preprocess -> dims.
+Every stage is keyed by a hash of its input files, the source of the modules
+it runs and its parameters. A stage whose key matches its last run, and
+whose outputs are still on disk as they were written, is skipped and its
+recorded result reused. Downstream stages are keyed on the bytes of their
+inputs, so a stage that reruns but writes the same output does not rerun
+the stages after it.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import dims
+import feature_cache
+import preprocess
+import specs
+import tables
+
+PIPELINE_CACHE = "pipeline_cache.json"
+RAW_CSV = "raw_products.csv"
+PROCESSED_CSV = "processed_products.csv"
+ENHANCED_CSV = "processed_products_enhanced.csv"
+STATS_FILE = "static/plots/stats.json"
+
+def file_hash(path):
+    """SHA-256 of a file's bytes, or None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def sources(*modules):
+    """Source files of modules, so code changes invalidate the stages using them"""
+    return [module.__file__ for module in modules]
+
+class Stage:
+    """One step of the pipeline and the files it reads and writes"""
+
+    def __init__(self, name, run, inputs, outputs, params=None):
+        """
+        Args:
+            name (str): Stage name, used in the cache and the report
+            run (callable): Runs the stage and returns a JSON-serializable result
+            inputs (list): Files the stage reads
+            outputs (list or callable): Files the stage writes, or a function
+                deriving them from the result
+            params (dict): Parameters that change the stage's output
+        """
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = params or {}
+
+    def key(self):
+        payload = {
+            "stage": self.name,
+            "params": self.params,
+            "inputs": {path: file_hash(path) for path in self.inputs}
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def output_files(self, result):
+        return self.outputs(result) if callable(self.outputs) else list(self.outputs)
+
+def stages(raw_csv=RAW_CSV, processed_csv=PROCESSED_CSV):
+    """The processing DAG, in dependency order"""
+    processed_files = [processed_csv, tables.arrow_path(processed_csv)]
+    return [
+        Stage(
+            "preprocess",
+            run=lambda: preprocess.run(input_file=raw_csv, output_file=processed_csv),
+            inputs=[raw_csv, *sources(preprocess, specs, tables, feature_cache)],
+            outputs=processed_files,
+            params={"extractor_version": preprocess.EXTRACTOR_VERSION}
+        ),
+        Stage(
+            "dims",
+            run=lambda: dims.run(input_file=processed_csv),
+            inputs=[*processed_files, *sources(dims, tables)],
+            outputs=lambda result: [ENHANCED_CSV, tables.arrow_path(ENHANCED_CSV), STATS_FILE,
+                                    *result["plots"].values()]
+        ),
+    ]
+
+def _load_cache(cache_file):
+    if not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+def _save_cache(cache, cache_file):
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_file, cache_file)
+
+def _outputs_intact(entry):
+    return all(file_hash(path) == digest for path, digest in entry["outputs"].items())
+
+def run(raw_csv=RAW_CSV, processed_csv=PROCESSED_CSV, cache_file=PIPELINE_CACHE, force=False):
+    """
+    Run preprocess and dims, skipping stages whose inputs have not changed.
+
+    Args:
+        raw_csv (str): Scraped products CSV
+        processed_csv (str): Processed products CSV
+        cache_file (str): Where stage keys, output hashes and results are kept
+        force (bool): Run every stage even if it could be reused
+
+    Returns:
+        dict: Result of every stage by name, and a report of what was
+            executed and what was reused
+    """
+    cache = _load_cache(cache_file)
+    results = {}
+    report = []
+
+    for stage in stages(raw_csv, processed_csv):
+        key = stage.key()
+        entry = cache.get(stage.name)
+        start = time.time()
+
+        if not force and entry and entry["key"] == key and _outputs_intact(entry):
+            status = "reused"
+            result = entry["result"]
+        else:
+            status = "executed"
+            result = stage.run()
+            cache[stage.name] = {
+                "key": key,
+                "outputs": {path: file_hash(path) for path in stage.output_files(result)},
+                "result": result,
+                "finished_at": datetime.now().isoformat()
+            }
+            _save_cache(cache, cache_file)
+
+        results[stage.name] = result
+        report.append({"stage": stage.name, "status": status, "key": key[:12],
+                       "duration": round(time.time() - start, 2)})
+        print(f"{'♻️' if status == 'reused' else '▶️'} {stage.name}: {status} ({key[:12]}) "
+              f"in {time.time() - start:.1f}s")
+
+    return {"results": results, "report": report}
+
+# Run the pipeline from the command line:
+#   python pipeline.py [--force]
+if __name__ == "__main__":
+    outcome = run(force="--force" in sys.argv)
+    print(json.dumps(outcome["report"], indent=2))
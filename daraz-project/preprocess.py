@@ -1,6 +1,23 @@
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
 import pandas as pd
 import re
 
+import feature_cache
+import specs
+import tables
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
 def extract_ram(text):
     """Extract RAM size in GB from product title."""
     text = str(text).lower()
@@ -41,43 +58,263 @@ def extract_cpu(text):
         return "ryzen3"
     return "other"
 
-def run(input_file="raw_products.csv", output_file="processed_products.csv"):
+# Numeric columns whose gaps are filled with 0 after extraction
+FILLED_COLUMNS = ["ram_gb", "storage_gb", "rating", "reviews"]
+
+# Smallest shard worth sending to another process
+MIN_SHARD_ROWS = 20000
+
+# Bump whenever the extractors change, so cached features are recomputed
+EXTRACTOR_VERSION = 4
+
+# Precompiled patterns for the vectorized path, in the same order of
+# precedence as the per-title extractors above. The named group keeps them
+# usable by pyarrow's RE2 kernels as well.
+RAM_PATTERNS = [re.compile(r"(?P<n>\d+)\s?gb\s?ram"), re.compile(r"ram\s?(?P<n>\d+)\s?gb")]
+TB_PATTERN = re.compile(r"(?P<n>\d+)\s?tb")
+GB_PATTERN = re.compile(r"(?P<n>\d+)\s?gb")
+CPU_KEYWORDS = [
+    ("i9", "i9"), ("i7", "i7"), ("i5", "i5"), ("i3", "i3"),
+    ("ryzen 9", "ryzen9"), ("ryzen 7", "ryzen7"), ("ryzen 5", "ryzen5"), ("ryzen 3", "ryzen3")
+]
+# No keyword overlaps another, so a title with a single occurrence has its
+# CPU at the leftmost match; only titles naming two need the precedence order
+CPU_ALTERNATION = "|".join(re.escape(keyword) for keyword, _ in CPU_KEYWORDS)
+
+def _to_number(captured):
+    # int() rather than to_numeric, so non-ASCII digits convert exactly as in the scalar extractors
+    return captured.map(int, na_action="ignore").astype(float)
+
+def _first_number(lower, patterns):
+    """Number captured by the first pattern that matches each title (NaN if none)"""
+    result = pd.Series(np.nan, index=lower.index)
+    for pattern in patterns:
+        missing = result.isna()
+        if not missing.any():
+            break
+        result[missing] = _to_number(lower[missing].str.extract(pattern, expand=False))
+    return result
+
+def _extract_re(lower):
+    """Extract features from lowercased titles with Python regexes"""
+    ram = _first_number(lower, RAM_PATTERNS)
+    tb = _to_number(lower.str.extract(TB_PATTERN, expand=False)) * 1024
+    storage = tb.where(tb.notna(), _first_number(lower, [GB_PATTERN]))
+    cpu = np.select(
+        [lower.str.contains(keyword, regex=False).to_numpy(dtype=bool) for keyword, _ in CPU_KEYWORDS],
+        [name for _, name in CPU_KEYWORDS],
+        default="other"
+    )
+    return ram.to_numpy(), storage.to_numpy(), cpu
+
+def _arrow_number(lower, pattern):
+    captured = pc.struct_field(pc.extract_regex(lower, pattern.pattern), [0])
+    return pc.cast(captured, pa.float64()).to_numpy(zero_copy_only=False)
+
+def _extract_arrow(lower):
+    """Extract features from lowercased ASCII titles with pyarrow's compute kernels"""
+    ram = _arrow_number(lower, RAM_PATTERNS[0])
+    ram = np.where(np.isnan(ram), _arrow_number(lower, RAM_PATTERNS[1]), ram)
+    tb = _arrow_number(lower, TB_PATTERN) * 1024
+    storage = np.where(np.isnan(tb), _arrow_number(lower, GB_PATTERN), tb)
+    
+    keyword = pc.struct_field(pc.extract_regex(lower, f"(?P<cpu>{CPU_ALTERNATION})"), [0]).dictionary_encode()
+    names = np.array([dict(CPU_KEYWORDS)[k] for k in keyword.dictionary.to_pylist()] + ["other"])
+    cpu = names[pc.fill_null(keyword.indices, len(names) - 1).to_numpy()]
+    several = pc.match_substring_regex(lower, f"(?:{CPU_ALTERNATION}).*(?:{CPU_ALTERNATION})")
+    several = several.to_numpy(zero_copy_only=False)
+    if several.any():
+        rivals = lower.filter(several)
+        cpu[several] = np.select(
+            [pc.match_substring(rivals, k).to_numpy(zero_copy_only=False) for k, _ in CPU_KEYWORDS],
+            [name for _, name in CPU_KEYWORDS],
+            default="other"
+        )
+    return ram, storage, cpu
+
+def _like_apply(values):
+    # Series.apply over the scalar extractors yields ints unless some title had no match
+    if not len(values):
+        return values.astype(object)
+    if values.notna().all():
+        return values.astype("int64")
+    return values
+
+def extract_features(titles, with_specs=True):
     """
-    Process raw product data and extract features.
+    Extract RAM, storage, CPU and the other specs for a whole column of titles at once.
+    
+    Gives the same values and dtypes as applying extract_ram, extract_storage
+    and extract_cpu row by row, but lowercases every title only once and
+    matches precompiled patterns over the whole column. With pyarrow
+    installed, ASCII titles are matched by its native kernels; the rest go
+    through Python's re, whose digit and whitespace classes also cover
+    non-ASCII characters. GPU, screen size, CPU generation, refresh rate and
+    storage type come from the single tokenizing scan of specs.py.
+    
+    RAM, storage and CPU keep their own passes: their rules search the whole
+    title in order of precedence (a TB size anywhere beats the first GB
+    size, i9 beats an earlier i7) and overlap each other, "8gb ram" being
+    the first GB size too, which a left-to-right tokenizer cannot reproduce.
     
     Args:
-        input_file (str): Path to raw CSV file
-        output_file (str): Path to save processed CSV
+        titles (Series): Product titles
+        with_specs (bool): Also extract specs.SPEC_COLUMNS
     
     Returns:
-        int: Number of rows in processed dataset
+        DataFrame: ram_gb, storage_gb, cpu (and specs.SPEC_COLUMNS) aligned with `titles`
+    """
+    # str() of a missing title is "nan", exactly like the scalar extractors see it
+    text = titles.astype(object).where(titles.notna(), "nan")
+    if pd.api.types.infer_dtype(text, skipna=False) != "string":
+        text = text.map(str)
+    
+    if pa is None:
+        ram, storage, cpu = _extract_re(text.str.lower())
+    else:
+        array = pa.array(text.to_numpy(), type=pa.string())
+        ram, storage, cpu = _extract_arrow(pc.ascii_lower(array))
+        other = ~pc.string_is_ascii(array).to_numpy(zero_copy_only=False)
+        if other.any():
+            ram[other], storage[other], cpu[other] = _extract_re(text[other].str.lower())
+    
+    features = pd.DataFrame({
+        "ram_gb": _like_apply(pd.Series(ram, index=titles.index)),
+        "storage_gb": _like_apply(pd.Series(storage, index=titles.index)),
+        "cpu": pd.Series(cpu, index=titles.index, dtype=object if titles.empty else None)
+    }, index=titles.index)
+    return features.join(specs.extract_specs(titles)) if with_specs else features
+
+def extract_features_parallel(titles, workers=None):
+    """
+    Extract features in a pool of processes, one contiguous shard of titles each.
+    
+    Shards are reassembled in their original order, so the result is the
+    same as extract_features(titles) whatever the number of workers.
+    
+    Args:
+        titles (Series): Product titles
+        workers (int): Number of processes (default: one per CPU)
+    
+    Returns:
+        DataFrame: Same columns as extract_features, aligned with `titles`
     """
-    # Load data
-    df = pd.read_csv(input_file, encoding="utf-8")
-    print(f"Loaded {len(df)} products")
+    workers = min(workers or os.cpu_count() or 1, -(-len(titles) // MIN_SHARD_ROWS))
+    if workers <= 1:
+        return extract_features(titles)
     
-    # Apply extraction functions
-    df["ram_gb"] = df["title"].apply(extract_ram)
-    df["storage_gb"] = df["title"].apply(extract_storage)
-    df["cpu"] = df["title"].apply(extract_cpu)
+    bounds = np.linspace(0, len(titles), workers + 1).astype(int)
+    shards = [titles.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    # Spawned rather than forked, as the API server calls this from a thread
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        features = pd.concat(pool.map(extract_features, shards))
+    
+    # A shard with no missing values comes back as ints, so settle the dtype on the whole column
+    features["ram_gb"] = _like_apply(features["ram_gb"].astype(float))
+    features["storage_gb"] = _like_apply(features["storage_gb"].astype(float))
+    return features
+
+def cached_features(titles, cache, extract=extract_features):
+    """
+    Extract features, parsing only titles not seen on an earlier run.
+    
+    Args:
+        titles (Series): Product titles
+        cache (FeatureCache): Cache to look titles up in and add new ones to
+        extract (callable): Extractor for the titles not cached yet
+    
+    Returns:
+        DataFrame: Same columns and values as extract_features(titles)
+    """
+    if titles.empty:
+        return extract_features(titles)
+    features = cache.lookup(titles, extract)
+    features["ram_gb"] = _like_apply(features["ram_gb"])
+    features["storage_gb"] = _like_apply(features["storage_gb"])
+    return features
+
+def _process(df, cache=None, workers=1):
+    """Add the extracted features to a frame of raw products and clean it up"""
+    # Extract all features in one vectorized pass, skipping known titles
+    extract = extract_features if workers == 1 else partial(extract_features_parallel, workers=workers)
+    features = cached_features(df["title"], cache, extract) if cache else extract(df["title"])
+    for col in features.columns:
+        df[col] = features[col]
     
     # Drop rows without price (should be very few)
     df = df.dropna(subset=["price"])
     
     # Fill missing numeric values
-    df["ram_gb"] = df["ram_gb"].fillna(0)
-    df["storage_gb"] = df["storage_gb"].fillna(0)
-    df["rating"] = df["rating"].fillna(0)
-    df["reviews"] = df["reviews"].fillna(0)
+    for col in FILLED_COLUMNS:
+        df[col] = df[col].fillna(0)
+    return tables.conform(df, "processed")
+
+def _run_chunked(input_file, output_file, chunksize, cache=None, workers=1):
+    """Process the CSV `chunksize` rows at a time, appending each chunk to the output"""
+    total = 0
+    writer = tables.TableWriter(output_file, "processed")
+    for i, chunk in enumerate(tables.read_csv(input_file, "raw", encoding="utf-8", chunksize=chunksize)):
+        total += len(chunk)
+        chunk = writer.write(_process(chunk, cache, workers))
+        if i == 0:
+            print(chunk.head(5))
+            tables.memory_report(chunk, "processed chunk")
+    writer.close()
+    print(f"Loaded {total} products in chunks of {chunksize}")
+    return writer.rows
+
+def run(input_file="raw_products.csv", output_file="processed_products.csv", use_cache=True, chunksize=None,
+        workers=1):
+    """
+    Process raw product data and extract features.
+    
+    Args:
+        input_file (str): Path to raw CSV file
+        output_file (str): Path to save processed CSV
+        use_cache (bool): Reuse features of titles seen on earlier runs
+        chunksize (int): Stream the input this many rows at a time, so
+            memory use stays bounded however large the file is
+        workers (int): Processes extracting features (None: one per CPU)
+    
+    Returns:
+        int: Number of rows in processed dataset
+    """
+    cache = feature_cache.FeatureCache(version=EXTRACTOR_VERSION) if use_cache else None
+    
+    if chunksize:
+        rows = _run_chunked(input_file, output_file, chunksize, cache, workers)
+    else:
+        # Load data
+        df = tables.read(input_file, "raw")
+        print(f"Loaded {len(df)} products")
+        tables.memory_report(df, "raw")
+        
+        df = _process(df, cache, workers)
+        tables.memory_report(df, "processed")
+        
+        # Save processed data (Arrow for the next stage, CSV as an export)
+        df = tables.write(df, output_file, "processed")
+        print(df.head(5))
+        rows = len(df)
     
-    # Save processed data
-    df.to_csv(output_file, index=False, encoding="utf-8")
-    print(f"✅ Saved processed dataset to {output_file} ({len(df)} rows)")
-    print(df.head(5))
+    if cache:
+        cache.save()
+        print(f"♻️ Feature cache: {cache.hit_rate:.1%} hit rate "
+              f"({cache.stats['hits']} cached, {cache.stats['misses']} extracted)")
+    print(f"✅ Saved processed dataset to {output_file} ({rows} rows)")
     
-    return len(df)
+    return rows
 
-# Allow script to run standalone
+# Allow script to run standalone:
+#   python preprocess.py [--chunksize N] [--workers N]
 if __name__ == "__main__":
-    num_rows = run(input_file="raw_products.csv", output_file="processed_products.csv")
-    print(f"Total rows processed: {num_rows}")
\ No newline at end of file
+    chunksize = None
+    if "--chunksize" in sys.argv:
+        chunksize = int(sys.argv[sys.argv.index("--chunksize") + 1])
+    workers = 1
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    num_rows = run(input_file="raw_products.csv", output_file="processed_products.csv", chunksize=chunksize,
+                   workers=workers)
+    print(f"Total rows processed: {num_rows}")
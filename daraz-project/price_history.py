@@ -0,0 +1,392 @@
+"""
+Time-partitioned price history store.
+Observations are kept as Parquet files under one directory per day
+(price_history/day=YYYY-MM-DD/). Each scrape appends new part files without
+reading the existing history, and reads over a time window only open the day
+partitions that overlap it. compact() is run separately to merge the part
+files of each day, deduplicate them and drop days past the retention period.
+A small "latest" table holding the last two observations of every product is
+kept up to date on each append, so price changes can be read without
+scanning the history at all.
+"""
+
+import glob
+import os
+import re
+import shutil
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+HISTORY_DIR = "price_history"
+HISTORY_COLUMNS = ['timestamp', 'product_id', 'title', 'price', 'rating', 'brand']
+LATEST_COLUMNS = ['product_id', 'timestamp', 'title', 'price']
+RETENTION_DAYS = 365
+
+PARTITION_PREFIX = "day="
+COMPACTED_PREFIX = "compacted-"
+
+# Legacy product ids are URL slugs ("lenovo-ideapad-i123-s456"); the item id
+# in them gives the same "i123" key scraper.product_key uses today
+LEGACY_ITEM_ID_PATTERN = re.compile(r"-i(\d+)(?:-s\d+)?$")
+
+def latest_file_for(history_dir=HISTORY_DIR):
+    """Path of the last-two-observations table kept inside a history directory"""
+    return os.path.join(history_dir, "latest.parquet")
+
+def local_time(timestamp):
+    """
+    Timestamp as naive local time, the way observations are recorded.
+    
+    Timezone-aware values (e.g. "2020-01-01T00:00:00Z") are converted to the
+    local zone first; None stays None.
+    """
+    if timestamp is None:
+        return None
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is not None:
+        timestamp = pd.Timestamp(timestamp.to_pydatetime().astimezone().replace(tzinfo=None))
+    return timestamp
+
+def partitions(history_dir=HISTORY_DIR, start=None, end=None):
+    """
+    List day partitions, oldest first, pruned to a time window.
+    
+    Args:
+        history_dir (str): History directory
+        start (datetime or str): Only partitions holding data at or after this time
+        end (datetime or str): Only partitions holding data at or before this time
+    
+    Returns:
+        list: (date, partition path) tuples
+    """
+    start_day = local_time(start).date() if start is not None else None
+    end_day = local_time(end).date() if end is not None else None
+    
+    found = []
+    for path in glob.glob(os.path.join(history_dir, PARTITION_PREFIX + "*")):
+        try:
+            day = datetime.strptime(os.path.basename(path)[len(PARTITION_PREFIX):], "%Y-%m-%d").date()
+        except ValueError:
+            continue
+        if (start_day and day < start_day) or (end_day and day > end_day):
+            continue
+        found.append((day, path))
+    return sorted(found)
+
+def _part_files(partition):
+    return sorted(glob.glob(os.path.join(partition, "*.parquet")))
+
+def exists(history_dir=HISTORY_DIR):
+    """Whether any history has been recorded"""
+    return any(_part_files(path) for _, path in partitions(history_dir))
+
+def _write_parquet(df, path):
+    # Readers only pick up *.parquet, so a half-written file is never seen
+    tmp_file = path + ".tmp"
+    df.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, path)
+
+def _normalize(df):
+    df = df.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['price'] = pd.to_numeric(df['price'], errors='coerce')
+    return df
+
+def read(history_dir=HISTORY_DIR, start=None, end=None, columns=None, product_id=None):
+    """
+    Read price observations, opening only the partitions inside the window.
+    
+    Args:
+        history_dir (str): History directory
+        start (datetime or str): Earliest observation time to include
+        end (datetime or str): Latest observation time to include
+        columns (list): Columns to load (default: all)
+        product_id (str): Only load this product's observations; the filter is
+            applied by the Parquet reader, so other rows are never loaded
+    
+    Returns:
+        DataFrame: Observations in partition order
+    """
+    columns = columns or HISTORY_COLUMNS
+    # The time filter needs the timestamp column even if the caller didn't ask for it
+    load_columns = columns if 'timestamp' in columns else ['timestamp'] + columns
+    filters = [('product_id', '==', product_id)] if product_id is not None else None
+    
+    files = [f for _, path in partitions(history_dir, start, end) for f in _part_files(path)]
+    if not files:
+        return pd.DataFrame(columns=columns)
+    
+    df = pd.concat([pd.read_parquet(f, columns=load_columns, filters=filters) for f in files],
+                   ignore_index=True)
+    if start is not None:
+        df = df[df['timestamp'] >= local_time(start)]
+    if end is not None:
+        df = df[df['timestamp'] <= local_time(end)]
+    return df[columns].reset_index(drop=True)
+
+def _last_two(observations):
+    """Keep the two most recent observations of every product"""
+    observations = observations.sort_values(['product_id', 'timestamp'], kind='stable')
+    return observations.groupby('product_id', sort=False).tail(2)
+
+def update_latest(batch, history_dir=HISTORY_DIR):
+    """
+    Merge a batch of observations into the latest-prices table.
+    
+    Without a table yet, it is seeded once from the full history, which
+    already contains the batch.
+    
+    Args:
+        batch (DataFrame): Rows just appended to the history
+        history_dir (str): History directory the table belongs to
+    
+    Returns:
+        DataFrame: The updated table
+    """
+    latest_file = latest_file_for(history_dir)
+    if os.path.exists(latest_file):
+        latest = pd.concat([pd.read_parquet(latest_file), _normalize(batch[LATEST_COLUMNS])], ignore_index=True)
+    else:
+        latest = read(history_dir, columns=LATEST_COLUMNS)
+    latest = _last_two(latest.dropna(subset=['product_id']))
+    
+    os.makedirs(history_dir, exist_ok=True)
+    _write_parquet(latest, latest_file)
+    return latest
+
+def to_batch(products, timestamp, key=None):
+    """
+    Turn scraped product rows into typed price observations.
+    
+    Args:
+        products (list): Scraped product rows
+        timestamp (datetime): Observation time shared by the whole batch
+        key (callable): Derives a product id from a row lacking one
+    
+    Returns:
+        DataFrame: One observation per product, in HISTORY_COLUMNS order
+    """
+    batch = pd.DataFrame({
+        'timestamp': timestamp,
+        'product_id': [p.get('product_id') or (key(p.get('url')) if key else None) for p in products],
+        'title': [p.get('title') for p in products],
+        'price': [p.get('price') for p in products],
+        'rating': [p.get('rating') for p in products],
+        'brand': [p.get('brand') for p in products]
+    }, columns=HISTORY_COLUMNS)
+    
+    # Fixed column types keep every stored batch readable together
+    batch = _normalize(batch)
+    batch['rating'] = pd.to_numeric(batch['rating'], errors='coerce')
+    return batch
+
+def append(products, history_dir=HISTORY_DIR, timestamp=None, key=None):
+    """
+    Append one batch of price observations as a new part file.
+    
+    Args:
+        products (list): Scraped product rows
+        history_dir (str): History directory
+        timestamp (datetime): Observation time shared by the whole batch
+        key (callable): Derives a product id from a row lacking one
+    
+    Returns:
+        DataFrame: The rows that were appended
+    """
+    timestamp = timestamp or datetime.now()
+    batch = to_batch(products, timestamp, key)
+    if batch.empty:
+        return batch
+    
+    partition = os.path.join(history_dir, f"{PARTITION_PREFIX}{timestamp:%Y-%m-%d}")
+    os.makedirs(partition, exist_ok=True)
+    _write_parquet(batch, os.path.join(partition, f"part-{uuid.uuid4().hex}.parquet"))
+    update_latest(batch, history_dir)
+    return batch
+
+def _load_latest(history_dir):
+    """The latest-prices table, built from the history on first use"""
+    latest_file = latest_file_for(history_dir)
+    if os.path.exists(latest_file):
+        return pd.read_parquet(latest_file)
+    if exists(history_dir):
+        return update_latest(pd.DataFrame(columns=HISTORY_COLUMNS), history_dir)
+    return None
+
+def price_changes(history_dir=HISTORY_DIR):
+    """
+    Compare the last two observed prices of every product.
+    
+    Args:
+        history_dir (str): History directory
+    
+    Returns:
+        list: Price changes, largest relative change first
+    """
+    df = _load_latest(history_dir)
+    if df is None:
+        return []
+    return changes_between_last_two(df)
+
+def last_prices(product_ids, history_dir=HISTORY_DIR):
+    """
+    Last known price of each of the given products.
+    
+    Args:
+        product_ids (list): Product keys to look up
+        history_dir (str): History directory
+    
+    Returns:
+        Series: Price by product id; products never seen before are absent
+    """
+    df = _load_latest(history_dir)
+    if df is None:
+        return pd.Series(dtype=float, name='price')
+    df = df[df['product_id'].isin(product_ids)].drop_duplicates('product_id', keep='last')
+    return df.set_index('product_id')['price']
+
+def changes_between_last_two(df):
+    """
+    Price changes from a table of each product's last two observations.
+    
+    Args:
+        df (DataFrame): Observations sorted by product and time, at most two per product
+    
+    Returns:
+        list: Price changes, largest relative change first
+    """
+    grouped = df.groupby('product_id', sort=False)
+    latest = grouped.nth(-1).set_index('product_id')
+    previous = grouped.nth(-2).set_index('product_id')
+    return _change_records(latest, previous['price'])
+
+def detect_changes(batch, previous_prices, threshold=0.0):
+    """
+    Price changes of a freshly written batch against the prices known before it.
+    
+    Args:
+        batch (DataFrame): Observations as returned by to_batch()
+        previous_prices (Series): Last known price by product id (see last_prices())
+        threshold (float): Only report changes larger than this many percent
+    
+    Returns:
+        list: Price changes, largest relative change first
+    """
+    latest = batch.dropna(subset=['product_id']).drop_duplicates('product_id', keep='last')
+    return _change_records(latest.set_index('product_id'), previous_prices, threshold)
+
+def _change_records(latest, previous_prices, threshold=0.0):
+    changes = latest.join(previous_prices.rename('old_price'), how='inner')
+    changes = changes.rename(columns={'price': 'new_price'})
+    changes['change'] = changes['new_price'] - changes['old_price']
+    changes['change_percent'] = changes['change'] / changes['old_price'] * 100
+    changes = changes[(changes['change'].abs() > 0) & (changes['change_percent'].abs() > threshold)]
+    
+    changes = changes.sort_values('change_percent', key=abs, ascending=False, kind='stable')
+    changes = changes.rename_axis('product_id').reset_index()
+    changes = changes[['product_id', 'title', 'old_price', 'new_price', 'change', 'change_percent', 'timestamp']]
+    # to_dict yields native Python scalars, so the result is JSON serializable as is
+    return changes.to_dict('records')
+
+def product_history(product_id, history_dir=HISTORY_DIR, start=None, end=None):
+    """
+    Price timeline of one product.
+    
+    Only the partitions inside the window are opened, and only the product's
+    rows of them are loaded; the SQLite backend answers this from an index
+    instead of scanning the partitions.
+    
+    Returns:
+        list: Observations (timestamp, title, price, rating) oldest first
+    """
+    df = read(history_dir, start, end, columns=['timestamp', 'title', 'price', 'rating'], product_id=product_id)
+    df = df.sort_values('timestamp', kind='stable')
+    # Missing values become None so the result serializes to valid JSON
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def compact(history_dir=HISTORY_DIR, retention_days=RETENTION_DAYS):
+    """
+    Merge each day's part files into one sorted, deduplicated file and
+    delete the days older than the retention period.
+    
+    Part files appended while compaction runs are left for the next run.
+    
+    Args:
+        history_dir (str): History directory
+        retention_days (int): Days of history to keep (None keeps everything)
+    
+    Returns:
+        dict: Partitions merged and expired, and rows kept
+    """
+    report = {"merged": 0, "expired": 0, "rows": 0}
+    cutoff = (datetime.now() - timedelta(days=retention_days)).date() if retention_days is not None else None
+    
+    for day, partition in partitions(history_dir):
+        if cutoff and day < cutoff:
+            shutil.rmtree(partition)
+            report["expired"] += 1
+            continue
+    
+        files = _part_files(partition)
+        if len(files) < 2:
+            if files:
+                report["rows"] += len(pd.read_parquet(files[0], columns=['product_id']))
+            continue
+    
+        df = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+        df = df.drop_duplicates(subset=['timestamp', 'product_id'], keep='last')
+        df = df.sort_values(['timestamp', 'product_id'], kind='stable')
+        _write_parquet(df, os.path.join(partition, f"{COMPACTED_PREFIX}{uuid.uuid4().hex}.parquet"))
+        for f in files:
+            os.remove(f)
+        report["merged"] += 1
+        report["rows"] += len(df)
+    
+    print(f"✅ Compacted {history_dir}: {report['merged']} partitions merged, "
+          f"{report['expired']} expired, {report['rows']} rows kept")
+    return report
+
+def import_csv(csv_file, history_dir=HISTORY_DIR):
+    """
+    Split a legacy single-file price_history.csv into day partitions.
+    
+    Legacy rows are keyed by URL slug; they are re-keyed by item id so their
+    history joins the observations scraped since. Slugs without an item id
+    are kept as they are, as scraper.product_key does.
+    
+    Returns:
+        int: Number of observations imported
+    """
+    df = pd.read_csv(csv_file)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601')
+    df = _normalize(df)
+    df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
+    item_ids = df['product_id'].str.extract(LEGACY_ITEM_ID_PATTERN, expand=False)
+    df['product_id'] = ('i' + item_ids).fillna(df['product_id'])
+    for day, rows in df.groupby(df['timestamp'].dt.date):
+        partition = os.path.join(history_dir, f"{PARTITION_PREFIX}{day:%Y-%m-%d}")
+        os.makedirs(partition, exist_ok=True)
+        _write_parquet(rows[HISTORY_COLUMNS], os.path.join(partition, f"part-{uuid.uuid4().hex}.parquet"))
+    
+    # Rebuilt from the full history on the next read
+    latest_file = latest_file_for(history_dir)
+    if os.path.exists(latest_file):
+        os.remove(latest_file)
+    print(f"✅ Imported {len(df)} observations from {csv_file}")
+    return len(df)
+
+# Allow compaction to run standalone, e.g. from cron:
+#   python price_history.py [--retention-days N]
+#   python price_history.py --import price_history.csv
+if __name__ == "__main__":
+    if "--import" in sys.argv:
+        import_csv(sys.argv[sys.argv.index("--import") + 1])
+        sys.exit(0)
+    
+    retention_days = RETENTION_DAYS
+    if "--retention-days" in sys.argv:
+        retention_days = int(sys.argv[sys.argv.index("--retention-days") + 1])
+    compact(retention_days=retention_days)
@@ -0,0 +1,218 @@
+"""
+Per-product OHLC rollups of the price history, for charting.
+Observations written to the history are folded into hourly and daily
+open/high/low/close/count buckets, so a chart over any time range can be
+served from a few hundred precomputed points instead of every observation.
+
+Rollups are kept in one directory per day for hourly buckets
+(price_rollups/hourly/YYYY-MM-DD/) and one per month for daily buckets
+(price_rollups/daily/YYYY-MM/). Each batch adds a small part file to the
+periods it covers without reading them, as the price history does, and
+compact() later merges each period's parts into one file. Each bucket keeps
+the times of its first and last observation, so buckets can be merged in
+any order and readers merge the parts they find on the fly.
+"""
+
+import glob
+import math
+import os
+import shutil
+import sys
+import uuid
+
+import pandas as pd
+
+import price_history
+
+ROLLUP_DIR = "price_rollups"
+COMPACTED_PREFIX = "compacted-"
+ROLLUP_COLUMNS = ['product_id', 'bucket', 'open', 'high', 'low', 'close', 'count', 'first_ts', 'last_ts']
+
+# resolution -> (bucket size, file period format)
+RESOLUTIONS = {
+    "hourly": (pd.Timedelta(hours=1), "%Y-%m-%d"),
+    "daily": (pd.Timedelta(days=1), "%Y-%m"),
+}
+
+def _combine(rollups):
+    """Merge rollup rows that share a (product_id, bucket)"""
+    by_first = rollups.sort_values('first_ts', kind='stable').groupby(['product_id', 'bucket'], sort=False)
+    by_last = rollups.sort_values('last_ts', kind='stable').groupby(['product_id', 'bucket'], sort=False)
+    merged = pd.DataFrame({
+        'open': by_first['open'].first(),
+        'high': by_first['high'].max(),
+        'low': by_first['low'].min(),
+        'close': by_last['close'].last(),
+        'count': by_first['count'].sum(),
+        'first_ts': by_first['first_ts'].min(),
+        'last_ts': by_last['last_ts'].max()
+    })
+    return merged.reset_index().sort_values(['product_id', 'bucket'], kind='stable')[ROLLUP_COLUMNS]
+
+def _to_rollups(observations, size):
+    """One single-observation bucket per price observation"""
+    price = observations['price'].astype(float)
+    return pd.DataFrame({
+        'product_id': observations['product_id'],
+        'bucket': observations['timestamp'].dt.floor(size),
+        'open': price,
+        'high': price,
+        'low': price,
+        'close': price,
+        'count': 1,
+        'first_ts': observations['timestamp'],
+        'last_ts': observations['timestamp']
+    }, columns=ROLLUP_COLUMNS)
+
+def _part_files(rollup_dir, resolution, period):
+    return sorted(glob.glob(os.path.join(rollup_dir, resolution, period, "*.parquet")))
+
+def _write_parquet(df, path):
+    # Readers only pick up *.parquet, so a half-written file is never seen
+    tmp_file = path + ".tmp"
+    df.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, path)
+
+def update(batch, rollup_dir=ROLLUP_DIR):
+    """
+    Fold a batch of price observations into the hourly and daily rollups.
+
+    The batch is added as a new part file to each period it covers; no
+    existing rollup is read or rewritten.
+
+    Args:
+        batch (DataFrame): Observations with product_id, timestamp and price columns
+        rollup_dir (str): Rollup directory
+
+    Returns:
+        int: Number of observations folded in
+    """
+    observations = batch[['product_id', 'timestamp', 'price']].dropna()
+    if observations.empty:
+        return 0
+    observations = observations.assign(timestamp=pd.to_datetime(observations['timestamp']))
+
+    for resolution, (size, period_format) in RESOLUTIONS.items():
+        rollups = _to_rollups(observations, size)
+        for period, rows in rollups.groupby(rollups['bucket'].dt.strftime(period_format)):
+            period_dir = os.path.join(rollup_dir, resolution, period)
+            os.makedirs(period_dir, exist_ok=True)
+            # Sorted by product so row-group statistics let readers skip other products
+            _write_parquet(_combine(rows), os.path.join(period_dir, f"part-{uuid.uuid4().hex}.parquet"))
+    return len(observations)
+
+def compact(rollup_dir=ROLLUP_DIR):
+    """
+    Merge the part files of every rollup period into one file.
+
+    Part files added while compaction runs are left for the next run.
+
+    Returns:
+        int: Number of periods merged
+    """
+    merged = 0
+    for resolution in RESOLUTIONS:
+        # Rollups written before periods had part files become their period's first part
+        for legacy_file in glob.glob(os.path.join(rollup_dir, resolution, "*.parquet")):
+            period_dir = os.path.splitext(legacy_file)[0]
+            os.makedirs(period_dir, exist_ok=True)
+            os.replace(legacy_file, os.path.join(period_dir, f"{COMPACTED_PREFIX}{uuid.uuid4().hex}.parquet"))
+
+        for period_dir in sorted(glob.glob(os.path.join(rollup_dir, resolution, "*", ""))):
+            period_dir = os.path.dirname(period_dir)
+            files = _part_files(rollup_dir, resolution, os.path.basename(period_dir))
+            if len(files) < 2:
+                continue
+            rollups = _combine(pd.concat([pd.read_parquet(f) for f in files], ignore_index=True))
+            _write_parquet(rollups, os.path.join(period_dir, f"{COMPACTED_PREFIX}{uuid.uuid4().hex}.parquet"))
+            for f in files:
+                os.remove(f)
+            merged += 1
+    return merged
+
+def _read(resolution, product_id, start, end, rollup_dir):
+    size, period_format = RESOLUTIONS[resolution]
+    first_bucket = start.floor(size)
+    periods = set(pd.date_range(first_bucket.normalize(), end, freq='D').strftime(period_format))
+
+    frames = [pd.read_parquet(f, filters=[('product_id', '==', product_id)])
+              for period in sorted(periods) for f in _part_files(rollup_dir, resolution, period)]
+    if not frames:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    # Parts not compacted yet may hold the same buckets
+    df = _combine(pd.concat(frames, ignore_index=True))
+    return df[(df['bucket'] >= first_bucket) & (df['bucket'] <= end)]
+
+def series(product_id, start=None, end=None, max_points=500, rollup_dir=ROLLUP_DIR):
+    """
+    OHLC price series of one product, at the finest resolution that fits.
+
+    Hourly buckets are used when the range holds no more than `max_points`
+    hours, otherwise daily buckets. Ranges too long even for daily buckets
+    are merged into n-day buckets, so the result never exceeds the budget.
+
+    Args:
+        product_id (str): Product key, e.g. "i123456"
+        start (datetime or str): Start of the range (default: 30 days before `end`)
+        end (datetime or str): End of the range (default: now)
+        max_points (int): Maximum number of buckets to return
+        rollup_dir (str): Rollup directory
+
+    Returns:
+        dict: resolution ("hourly", "daily" or e.g. "7d") and the buckets, oldest first
+
+    Raises:
+        ValueError: If the range is empty or `max_points` is below 1
+    """
+    end = price_history.local_time(end) if end is not None else pd.Timestamp.now()
+    start = price_history.local_time(start) if start is not None else end - pd.Timedelta(days=30)
+    if start > end:
+        raise ValueError("start must not be after end")
+    if max_points < 1:
+        raise ValueError("max_points must be at least 1")
+
+    span = end - start
+    hourly_size = RESOLUTIONS["hourly"][0]
+    daily_size = RESOLUTIONS["daily"][0]
+
+    if math.ceil(span / hourly_size) + 1 <= max_points:
+        resolution = "hourly"
+        df = _read("hourly", product_id, start, end, rollup_dir)
+    else:
+        resolution = "daily"
+        df = _read("daily", product_id, start, end, rollup_dir)
+        days = math.ceil((math.ceil(span / daily_size) + 1) / max_points)
+        if days > 1:
+            # n-day buckets counted from the start of the range
+            resolution = f"{days}d"
+            first_bucket = start.floor(daily_size)
+            width = days * daily_size
+            df = _combine(df.assign(bucket=first_bucket + (df['bucket'] - first_bucket) // width * width))
+
+    df = df.sort_values('bucket', kind='stable')
+    points = df[['bucket', 'open', 'high', 'low', 'close', 'count']].rename(columns={'bucket': 'timestamp'})
+    return {"resolution": resolution, "points": points.to_dict('records')}
+
+def rebuild(observations, rollup_dir=ROLLUP_DIR):
+    """
+    Recompute all rollups from raw observations, e.g. for history recorded
+    before rollups existed.
+
+    Returns:
+        int: Number of observations rolled up
+    """
+    if os.path.isdir(rollup_dir):
+        shutil.rmtree(rollup_dir)
+    count = update(observations, rollup_dir)
+    print(f"✅ Rebuilt {rollup_dir} from {count} observations")
+    return count
+
+# Rebuild the rollups from the partitioned history, or merge their part files:
+#   python price_rollups.py --rebuild
+#   python price_rollups.py --compact
+if __name__ == "__main__":
+    if "--rebuild" in sys.argv:
+        rebuild(price_history.read(columns=['product_id', 'timestamp', 'price']))
+    elif "--compact" in sys.argv:
+        print(f"✅ Compacted {compact()} rollup periods")
@@ -0,0 +1,139 @@
+"""
+Streaming row sink for the Daraz scraper.
+Rows are appended to the output CSV in fixed-size batches as pages arrive,
+with a checkpoint of the pages written after every flush so a crashed crawl
+can be resumed.
+"""
+
+import json
+import os
+
+import pandas as pd
+
+RAW_COLUMNS = [
+    "product_id", "title", "brand", "price", "rating", "reviews",
+    "url", "image_url", "local_image", "scraped_at", "search_term"
+]
+
+class RowSink:
+    """Ordered, batched CSV writer with a resumable checkpoint"""
+
+    def __init__(self, out_file, batch_size=500, resume=False, on_flush=None, columns=RAW_COLUMNS,
+                 dedup_key=None):
+        """
+        Args:
+            out_file (str): CSV file rows are appended to
+            batch_size (int): Number of rows buffered before a flush
+            resume (bool): Continue from the last checkpoint instead of starting over
+            on_flush (callable): Called with each flushed batch of rows
+            columns (list): Output column order
+            dedup_key (str): Column whose repeated values are dropped after the first row
+        """
+        self.out_file = out_file
+        self.checkpoint_file = out_file + ".checkpoint.json"
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.columns = columns
+        self.dedup_key = dedup_key
+
+        self.next_seq = 0
+        self.count = 0
+        self.batch = []
+        self.batch_pages = []
+        self.pending = {}
+        # term -> pages whose rows are safely on disk
+        self.done = {}
+        # Hash index of keys already written, for cross-page dedup
+        self.seen = set()
+        self.duplicates = 0
+
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint:
+            # Drop anything written after the last checkpoint
+            with open(out_file, 'r+b') as f:
+                f.truncate(checkpoint["bytes"])
+            self.done = {term: set(pages) for term, pages in checkpoint["done"].items()}
+            self.count = checkpoint["rows"]
+            if dedup_key and self.count:
+                self.seen = set(pd.read_csv(out_file, usecols=[dedup_key], dtype=str)[dedup_key])
+            print(f"⏩ Resuming {out_file}: {sum(map(len, self.done.values()))} pages already done ({self.count} rows)")
+        else:
+            for path in (out_file, self.checkpoint_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_file) or not os.path.exists(self.out_file):
+            return None
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_checkpoint(self):
+        checkpoint = {
+            "done": {term: sorted(pages) for term, pages in self.done.items()},
+            "rows": self.count,
+            "bytes": os.path.getsize(self.out_file) if os.path.exists(self.out_file) else 0
+        }
+        tmp_file = self.checkpoint_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_file, self.checkpoint_file)
+
+    def add(self, seq, term, page, rows):
+        """
+        Accept the rows of one page.
+
+        `seq` is the order the page was handed out in; pages are written in
+        that order so the output does not depend on which request finished first.
+        """
+        self.pending[seq] = (term, page, rows)
+        while self.next_seq in self.pending:
+            term, page, rows = self.pending.pop(self.next_seq)
+            # Failed pages (None) are not checkpointed, so a resume retries them
+            if rows is not None:
+                self.batch.extend(self._dedup(rows))
+                self.batch_pages.append((term, page))
+            self.next_seq += 1
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+
+    def _dedup(self, rows):
+        if not self.dedup_key:
+            return rows
+        unique = []
+        for row in rows:
+            key = row.get(self.dedup_key)
+            if key in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(key)
+            unique.append(row)
+        return unique
+
+    def flush(self):
+        """Append buffered rows to the output file and record a checkpoint"""
+        if self.batch:
+            write_header = not os.path.exists(self.out_file) or os.path.getsize(self.out_file) == 0
+            pd.DataFrame(self.batch, columns=self.columns).to_csv(
+                self.out_file, mode='a', header=write_header, index=False
+            )
+            self.count += len(self.batch)
+            if self.on_flush:
+                self.on_flush(self.batch)
+            self.batch = []
+        for term, page in self.batch_pages:
+            self.done.setdefault(term, set()).add(page)
+        self.batch_pages = []
+        self._save_checkpoint()
+
+    def close(self):
+        """Flush remaining rows and mark the crawl complete"""
+        self.flush()
+        if not os.path.exists(self.out_file):
+            pd.DataFrame(columns=self.columns).to_csv(self.out_file, index=False)
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        return self.count
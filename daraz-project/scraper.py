@@ -76,174 +76,505 @@
 
 import requests
 from bs4 import BeautifulSoup
-import pandas as pd
 import time
-import random
-import json
 import os
+import sys
 from datetime import datetime
 import hashlib
+import re
 
-def download_image(url, product_id, images_dir="static/images"):
-    """Download product image and return local path"""
+import fetcher
+import http_pool
+import image_pipeline
+import image_store
+import page_cache
+import row_sink
+import frontier as frontier_lib
+import archive as archive_lib
+import catalog_decoder
+import price_history
+import history_db
+import price_rollups
+
+# Bump when the shape of scraped rows changes, so cached rows are rebuilt
+ROW_VERSION = 2
+
+# Daraz product URLs end in "-i<item id>-s<sku id>.html"
+ITEM_ID_PATTERN = re.compile(r"-i(\d+)(?:-s\d+)?\.html")
+
+def product_key(product_url, item_id=None):
+    """
+    Canonical product key shared by the scraper, price history and the API.
+    
+    Args:
+        product_url (str): Daraz product URL
+        item_id (str): Item id from the catalog response, if present
+    
+    Returns:
+        str: "i<item id>", or a URL-derived fallback when no item id is found
+    """
+    if item_id:
+        return f"i{item_id}"
+    product_url = product_url or ""
+    m = ITEM_ID_PATTERN.search(product_url)
+    if m:
+        return f"i{m.group(1)}"
+    slug = product_url.split('?')[0].rstrip('/').split('/')[-1].split('.')[0]
+    return slug or hashlib.md5(product_url.encode()).hexdigest()[:16]
+
+def fetch_image(url, product_id, images_dir="static/images", timeout=10, max_bytes=None):
+    """
+    Download a product image within a time and size limit.
+    
+    Images are stored under the hash of their content, so the same picture
+    is kept once however many products or runs it appears in, and URLs
+    downloaded before are not fetched again.
+    
+    Args:
+        url (str): Image URL
+        product_id (str): Product the image belongs to (unused by the content-addressed store)
+        images_dir (str): Directory images are saved to
+        timeout (float): Time limit for the whole download in seconds
+        max_bytes (int): Abandon the download once it grows past this size
+    
+    Returns:
+        tuple: (local path or None, bytes downloaded)
+    """
     try:
         os.makedirs(images_dir, exist_ok=True)
-        
-        # Generate unique filename
-        filename = f"{product_id}_{hashlib.md5(url.encode()).hexdigest()[:8]}.jpg"
-        filepath = os.path.join(images_dir, filename)
+        store = image_store.get_store(images_dir)
         
         # Skip if already downloaded
-        if os.path.exists(filepath):
-            return f"/images/{filename}"
+        known = store.lookup(url)
+        if known:
+            return known, 0
         
-        # Download image
-        response = requests.get(url, timeout=10, stream=True)
-        if response.status_code == 200:
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(1024):
+        # Download image over the shared keep-alive pool, hashing as it streams
+        deadline = time.monotonic() + timeout
+        size = 0
+        digest = hashlib.sha256()
+        head = b""
+        with http_pool.get_session().get(url, timeout=timeout, stream=True) as response:
+            if response.status_code != 200:
+                return None, 0
+            
+            f, tmp_path = store.temp_file()
+            aborted = False
+            with f:
+                for chunk in response.iter_content(8192):
+                    size += len(chunk)
+                    if time.monotonic() > deadline or (max_bytes and size > max_bytes):
+                        aborted = True
+                        break
+                    if len(head) < 16:
+                        head = (head + chunk)[:16]
+                    digest.update(chunk)
                     f.write(chunk)
-            return f"/images/{filename}"
+            
+            if aborted or size == 0:
+                os.remove(tmp_path)
+                print(f"Abandoned image {url}: over time or size limit")
+                return None, size
+            
+            return store.commit(tmp_path, digest.hexdigest(), url, head), size
     except Exception as e:
         print(f"Failed to download image: {e}")
-    return None
-
-def save_price_history(products, history_file="price_history.csv"):
-    """Track price changes over time"""
-    timestamp = datetime.now()
-    
-    # Load existing history
-    if os.path.exists(history_file):
-        history_df = pd.read_csv(history_file)
-    else:
-        history_df = pd.DataFrame()
-    
-    # Add new entries
-    for product in products:
-        new_entry = {
-            'timestamp': timestamp,
-            'product_id': product.get('url', '').split('/')[-1].split('.')[0],
-            'title': product.get('title'),
-            'price': product.get('price'),
-            'rating': product.get('rating'),
-            'brand': product.get('brand')
-        }
-        history_df = pd.concat([history_df, pd.DataFrame([new_entry])], ignore_index=True)
-    
-    history_df.to_csv(history_file, index=False)
-    return history_df
-
-def get_price_changes(history_file="price_history.csv"):
-    """Analyze price changes over time"""
-    if not os.path.exists(history_file):
-        return []
-    
-    df = pd.read_csv(history_file)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    changes = []
-    for product_id in df['product_id'].unique():
-        product_data = df[df['product_id'] == product_id].sort_values('timestamp')
-        if len(product_data) > 1:
-            latest = product_data.iloc[-1]
-            previous = product_data.iloc[-2]
-            price_change = latest['price'] - previous['price']
-            
-            if abs(price_change) > 0:
-                changes.append({
-                    'title': latest['title'],
-                    'old_price': previous['price'],
-                    'new_price': latest['price'],
-                    'change': price_change,
-                    'change_percent': (price_change / previous['price']) * 100,
-                    'timestamp': latest['timestamp']
-                })
+    return None, 0
+
+def download_image(url, product_id, images_dir="static/images"):
+    """Download product image and return local path"""
+    return fetch_image(url, product_id, images_dir)[0]
+
+# Price history storage: "parquet" (day-partitioned files) or "sqlite" (indexed
+# by product, for per-product timelines), e.g. PRICE_HISTORY_BACKEND=sqlite
+PRICE_HISTORY_BACKEND = os.environ.get("PRICE_HISTORY_BACKEND", "parquet").strip().lower()
+PRICE_HISTORY_BACKENDS = ("parquet", "sqlite")
+
+# Percent change a price has to exceed before on_price_change is called
+PRICE_CHANGE_THRESHOLD = 5.0
+
+def price_store(backend=None):
+    """
+    Resolve a price history backend.
     
-    return sorted(changes, key=lambda x: abs(x['change_percent']), reverse=True)
+    Returns:
+        tuple: (backend module, default history location)
+    """
+    backend = backend or PRICE_HISTORY_BACKEND
+    if backend not in PRICE_HISTORY_BACKENDS:
+        raise ValueError(f"Unknown price history backend {backend!r}, expected one of {PRICE_HISTORY_BACKENDS}")
+    if backend == "sqlite":
+        return history_db, history_db.HISTORY_DB
+    return price_history, price_history.HISTORY_DIR
 
-def scrape_laptops(search_term="laptop", max_pages=5, out_file="raw_products.csv", download_images=True):
+def save_price_history(products, history_path=None, timestamp=None, backend=None, on_price_change=None,
+                       threshold=PRICE_CHANGE_THRESHOLD):
     """
-    Scrape Daraz for laptop products with image downloading and price tracking.
+    Track price changes over time by appending this batch to the history
+    and folding it into the hourly and daily chart rollups.
+    
+    Args:
+        products (list): Scraped product rows
+        history_path (str): History location (default: the backend's)
+        timestamp (datetime): Observation time shared by the batch
+        backend (str): "parquet" or "sqlite" (default: PRICE_HISTORY_BACKEND)
+        on_price_change (callable): Called with each product whose price moved by more
+            than `threshold` percent since its last known price
+        threshold (float): Minimum change in percent reported to `on_price_change`
+    
+    Returns:
+        DataFrame: The observations that were written
+    """
+    store, default_path = price_store(backend)
+    history_path = history_path or default_path
+    
+    previous_prices = None
+    if on_price_change is not None:
+        # Looked up before the write, which replaces them as the last known prices
+        product_ids = [p.get('product_id') or product_key(p.get('url')) for p in products]
+        previous_prices = store.last_prices(product_ids, history_path)
+    
+    batch = store.append(products, history_path, timestamp=timestamp or datetime.now(), key=product_key)
+    if not batch.empty:
+        price_rollups.update(batch)
+    
+    if previous_prices is not None and not batch.empty:
+        for change in price_history.detect_changes(batch, previous_prices, threshold):
+            on_price_change(change)
+    return batch
+
+def get_price_changes(history_path=None, backend=None):
+    """Analyze price changes between each product's last two observations"""
+    store, default_path = price_store(backend)
+    return store.price_changes(history_path or default_path)
+
+def get_product_history(product_id, history_path=None, start=None, end=None, backend=None):
+    """Price timeline of a single product, oldest observation first"""
+    store, default_path = price_store(backend)
+    return store.product_history(product_id, history_path or default_path, start=start, end=end)
+
+def get_price_chart(product_id, start=None, end=None, max_points=500):
+    """OHLC price series of a single product, sized to fit `max_points`"""
+    return price_rollups.series(product_id, start=start, end=end, max_points=max_points)
+
+
+CATALOG_URL = "https://www.daraz.pk/catalog/"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+}
+
+def _queue_images(rows, images):
+    """Queue the images of already built rows on the background downloader"""
+    if images is not None:
+        for row in rows:
+            if row.get("image_url"):
+                images.submit(row["image_url"], row["product_id"])
+    return rows
+
+def scrape_page(search_term, page, images=None, cache=None, url=None, archive=None):
+    """
+    Fetch and parse a single catalog page.
     
     Args:
         search_term (str): Product search term
-        max_pages (int): Number of pages to scrape
+        page (int): Catalog page number
+        images (ImageDownloader): Background downloader to queue product images on
+        cache (PageCache): Page cache used for conditional requests
+        url (str): Page URL, if already built by the crawl frontier
+        archive (ResponseArchive): Archive raw response bodies are appended to
+    
+    Returns:
+        list: Product rows found on the page ([] if the page is empty),
+            or None if it could not be parsed
+    
+    Raises:
+        fetcher.RetryableError: On network errors, throttling (429/503) and 5xx
+    """
+    print(f"Scraping '{search_term}' page {page}...")
+    url = url or f"{CATALOG_URL}?q={search_term}&page={page}&ajax=true"
+
+    cache_entry = cache.get(url) if cache is not None else None
+    request_headers = dict(HEADERS)
+    if cache is not None:
+        request_headers.update(cache.conditional_headers(cache_entry))
+
+    try:
+        r = http_pool.get_session().get(url, headers=request_headers, timeout=10)
+    except requests.RequestException as e:
+        print(f"❌ Request failed on page {page}: {e}")
+        raise fetcher.RetryableError(str(e))
+
+    if r.status_code == 304 and cache_entry is not None:
+        print(f"♻️ Page {page} not modified, reusing cached rows")
+        return _queue_images(cache.reuse(cache_entry, "not_modified"), images)
+
+    if r.status_code in (429, 503):
+        retry_after = fetcher.parse_retry_after(r.headers.get("Retry-After"))
+        print(f"⚠️ Throttled on page {page} — HTTP {r.status_code}, retry after {retry_after}s")
+        raise fetcher.RetryableError(f"HTTP {r.status_code}", throttled=True, retry_after=retry_after)
+
+    if r.status_code >= 500:
+        print(f"⚠️ Server error on page {page} — HTTP {r.status_code}")
+        raise fetcher.RetryableError(f"HTTP {r.status_code}")
+
+    if r.status_code != 200:
+        print(f"⚠️ Skipping page {page} — HTTP {r.status_code}")
+        return None
+
+    # Identical body to the last fetch: skip parsing and row building
+    body_hash = None
+    if cache is not None:
+        body_hash = cache.body_hash(r.content)
+        if cache_entry is not None and cache_entry.get("body_hash") == body_hash:
+            print(f"♻️ Page {page} unchanged, reusing cached rows")
+            return _queue_images(cache.reuse(cache_entry, "same_body"), images)
+        cache.miss()
+
+    # Keep the raw body so parsing can be re-run offline
+    if archive is not None:
+        archive.record(search_term, page, url, r.text)
+
+    rows = parse_catalog(r.content, search_term, page, images)
+    if rows is not None and cache is not None:
+        cache.put(url, r, body_hash, rows)
+
+    return rows
+
+def parse_catalog(body, search_term, page, images=None, scraped_at=None):
+    """
+    Build product rows from a raw catalog response body.
+    
+    Args:
+        body (str or bytes): Catalog JSON as returned by Daraz
+        search_term (str): Search term the page belongs to
+        page (int): Catalog page number
+        images (ImageDownloader): Background downloader to queue product images on
+        scraped_at (str): Timestamp to stamp rows with (defaults to now)
+    
+    Returns:
+        list: Product rows ([] if the page is empty), or None if the body is not valid
+    """
+    rows = []
+    try:
+        # Only the listItems fields used below are decoded
+        items = catalog_decoder.decode_list_items(body)
+        if not items:
+            print(f"⚠️ No products found on page {page}")
+
+        for hit in items:
+            product_url = "https:" + hit.productUrl
+            product_id = product_key(product_url, hit.itemId)
+            image_url = hit.image
+            
+            # Queue image download; local_image is back-filled once it lands
+            if images is not None and image_url:
+                images.submit(image_url, product_id)
+            
+            rows.append({
+                "product_id": product_id,
+                "title": hit.name,
+                "brand": hit.brandName,
+                "price": hit.price,
+                "rating": hit.ratingScore,
+                "reviews": hit.review,
+                "url": product_url,
+                "image_url": image_url,
+                "local_image": "",
+                "scraped_at": scraped_at or datetime.now().isoformat(),
+                "search_term": search_term
+            })
+    except ValueError:
+        print(f"❌ Failed to parse JSON on page {page}")
+        return None
+    except Exception as e:
+        print(f"❌ Unexpected error: {e}")
+        return None
+
+    return rows
+
+def replay_archive(out_file="raw_products.csv", archive_dir=archive_lib.ARCHIVE_DIR, until=None, batch_size=500,
+                   images_dir="static/images"):
+    """
+    Rebuild the raw products CSV from archived responses, without any network.
+    
+    The most recent archived fetch of every (term, page) is parsed with the
+    current parse_catalog, so field-mapping changes can be tried offline.
+    Price history is left untouched and nothing is downloaded: `local_image`
+    is filled from the image store for images fetched by earlier crawls.
+    
+    Args:
+        out_file (str): Output CSV filename
+        archive_dir (str): Directory holding the response archive
+        until (str): Replay the archive as of this ISO timestamp
+        batch_size (int): Rows buffered before they are appended to `out_file`
+        images_dir (str): Image store to look downloaded images up in
+    
+    Returns:
+        int: Number of products written
+    """
+    start_time = time.time()
+    latest = archive_lib.latest_pages(archive_dir, until)
+    
+    # Same page-major, term-interleaved order a live crawl writes in
+    order = {key: seq for seq, key in enumerate(sorted(latest, key=lambda key: (key[1], key[0])))}
+    sink = row_sink.RowSink(out_file, batch_size=batch_size, dedup_key="product_id")
+    store = image_store.get_store(images_dir)
+    
+    for record in archive_lib.iter_records(archive_dir):
+        key = (record["term"], record["page"])
+        if latest.get(key) != record["fetched_at"]:
+            continue
+        del latest[key]
+        rows = parse_catalog(record["body"], record["term"], record["page"], scraped_at=record["fetched_at"])
+        for row in rows:
+            if row["image_url"]:
+                row["local_image"] = store.lookup(row["image_url"]) or ""
+        sink.add(order[key], record["term"], record["page"], rows)
+    
+    num_products = sink.close()
+    print(f"✅ Replayed {len(order)} archived pages into {out_file}: "
+          f"{num_products} products in {time.time() - start_time:.2f}s")
+    return num_products
+
+def create_frontier(max_pages=5, rate=2.0, burst=2, host_rates=None):
+    """Create an empty crawl frontier for the Daraz catalog"""
+    return frontier_lib.CrawlFrontier(CATALOG_URL, max_pages=max_pages, rate=rate, burst=burst, host_rates=host_rates)
+
+def scrape_terms(terms, max_pages=5, out_file="raw_products.csv", download_images=True,
+                 concurrency=4, rate=2.0, burst=2, wait_for_images=False, use_cache=True,
+                 batch_size=500, resume=False, frontier=None, priority=0, archive_responses=True,
+                 on_price_change=None, price_change_threshold=PRICE_CHANGE_THRESHOLD):
+    """
+    Scrape several Daraz search terms in one concurrent crawl.
+    
+    All (term, page) work items go through a single crawl frontier: pages are
+    deduplicated by URL, interleaved across terms, and paced by one token-bucket
+    limiter per host, so every term shares the same politeness budget. Terms
+    stop early once a page comes back empty. Throttled or failing pages are
+    retried with backoff and a final dead-letter pass, while a per-host circuit
+    breaker slows the crawl when Daraz pushes back. Images download in the background
+    and the `local_image` column is back-filled when they finish. Pages that
+    have not changed since the last run are served from the page cache. Rows
+    are appended to `out_file` in batches as pages arrive, so memory stays flat
+    and an interrupted crawl can be resumed. Products are keyed by their Daraz
+    item id and duplicates seen on several pages or terms are written once.
+    Each written batch is compared against the last known prices, so price
+    changes are reported while the crawl is still running.
+    
+    Args:
+        terms (list): Product search terms
+        max_pages (int): Number of pages to scrape per term
         out_file (str): Output CSV filename
         download_images (bool): Whether to download product images
+        concurrency (int): Maximum number of page requests in flight
+        rate (float): Politeness limit in requests per second per host
+        burst (int): Requests allowed back to back before pacing kicks in
+        wait_for_images (bool): Block until image downloads finish and are back-filled
+        use_cache (bool): Send conditional requests and reuse rows of unchanged pages
+        batch_size (int): Rows buffered before they are appended to `out_file`
+        resume (bool): Continue an interrupted crawl, skipping pages already written
+        frontier (CrawlFrontier): Frontier to crawl, e.g. one the API keeps adding terms to
+        priority (int): Frontier priority of `terms`; lower values are crawled first
+        archive_responses (bool): Append raw catalog responses to the response archive
+        on_price_change (callable): Called with each price change detected as batches are written
+        price_change_threshold (float): Minimum change in percent reported to `on_price_change`
     
     Returns:
         int: Number of products scraped
     """
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
-    }
-    
     os.makedirs("static/images", exist_ok=True) 
-    rows = []
 
-    for page in range(1, max_pages + 1):
-        print(f"Scraping page {page}...")
-        url = f"https://www.daraz.pk/catalog/?q={search_term}&page={page}&ajax=true"
+    # Images download on their own worker pool so they never stall the page loop
+    images = image_pipeline.ImageDownloader(fetch_image) if download_images else None
+    cache = page_cache.PageCache(version=ROW_VERSION) if use_cache else None
+    archive = archive_lib.ResponseArchive() if archive_responses else None
 
-        try:
-            r = requests.get(url, headers=headers, timeout=10)
-        except Exception as e:
-            print(f"❌ Request failed on page {page}: {e}")
-            continue
+    # Rows are streamed to disk in batches; price history and chart rollups
+    # are recorded per batch, each as small append-only part files
+    scrape_time = datetime.now()
+    sink = row_sink.RowSink(
+        out_file,
+        batch_size=batch_size,
+        resume=resume,
+        on_flush=lambda batch: save_price_history(
+            batch,
+            timestamp=scrape_time,
+            on_price_change=on_price_change,
+            threshold=price_change_threshold
+        ),
+        dedup_key="product_id"
+    )
 
-        if r.status_code != 200:
-            print(f"⚠️ Skipping page {page} — HTTP {r.status_code}")
-            time.sleep(2)
-            continue
+    if frontier is None:
+        frontier = create_frontier(max_pages=max_pages, rate=rate, burst=burst)
+    for term, pages in sink.done.items():
+        frontier.done.setdefault(term, set()).update(pages)
+    for term in terms:
+        frontier.add_term(term, priority=priority, max_pages=max_pages)
+
+    def handle(item, rows):
+        # An empty page means the term has no more results
+        if rows == []:
+            frontier.exhaust(item.term, item.page)
+        sink.add(item.seq, item.term, item.page, rows)
+
+    crawl_stats = fetcher.crawl(
+        frontier,
+        lambda item: scrape_page(item.term, item.page, images, cache, url=item.url, archive=archive),
+        concurrency=concurrency,
+        on_result=handle
+    )
+
+    num_products = sink.close()
+    print(f"✅ Saved {num_products} products to {out_file} ({sink.duplicates} cross-page duplicates dropped)")
+    # Merged once the crawl is over, outside its event loop
+    print(f"📈 Compacted {price_rollups.compact()} chart rollup periods")
+    if archive is not None:
+        archive.close()
+        print(f"🗄️ Archived {archive.count} raw responses to {archive.path}")
+    
+    pool = http_pool.pool_stats()
+    print(f"🔌 HTTP pool: {pool['hits']} reused / {pool['misses']} new connections")
+    print(f"🔁 Retries: {crawl_stats['retries']} ({crawl_stats['throttled']} throttled, "
+          f"{crawl_stats['breaker_trips']} circuit trips); dead letters: {crawl_stats['dead_letters']} "
+          f"({crawl_stats['recovered']} recovered on the final pass)")
+    if cache is not None:
+        c = cache.stats
+        print(f"♻️ Page cache: {c['not_modified'] + c['same_body']} unchanged, {c['misses']} parsed")
+    
+    if images is not None:
+        backfill = images.finish_in_background(out_file)
+        if wait_for_images:
+            backfill.join()
+    
+    return num_products
 
-        try:
-            data = r.json()
-            items = data.get("mods", {}).get("listItems", [])
-            if not items:
-                print(f"⚠️ No products found on page {page}")
-                continue
-
-            for idx, hit in enumerate(items):
-                product_id = f"p{page}_{idx}"
-                image_url = hit.get("image", "")
-                
-                # Download image if enabled
-                local_image_path = None
-                if download_images and image_url:
-                    local_image_path = download_image(image_url, product_id)
-                
-                rows.append({
-                    "product_id": product_id,
-                    "title": hit.get("name"),
-                    "brand": hit.get("brandName"),
-                    "price": hit.get("price"),
-                    "rating": hit.get("ratingScore"),
-                    "reviews": hit.get("review"),
-                    "url": "https:" + hit.get("productUrl", ""),
-                    "image_url": image_url,
-                    "local_image": local_image_path or "",
-                    "scraped_at": datetime.now().isoformat()
-                })
-        except json.JSONDecodeError:
-            print(f"❌ Failed to parse JSON on page {page}")
-        except Exception as e:
-            print(f"❌ Unexpected error: {e}")
-
-        time.sleep(random.uniform(1, 2))
-
-    # Save to CSV
-    df = pd.DataFrame(rows)
-    df.to_csv(out_file, index=False)
-    print(f"✅ Saved {len(df)} products to {out_file}")
-    
-    # Track price history
-    save_price_history(rows)
-    
-    return len(df)
+def scrape_laptops(search_term="laptop", max_pages=5, out_file="raw_products.csv", download_images=True, **kwargs):
+    """
+    Scrape Daraz for laptop products with image downloading and price tracking.
+    
+    Args:
+        search_term (str): Product search term
+        max_pages (int): Number of pages to scrape
+        out_file (str): Output CSV filename
+        download_images (bool): Whether to download product images
+        **kwargs: Crawl options passed through to scrape_terms
+    
+    Returns:
+        int: Number of products scraped
+    """
+    return scrape_terms([search_term], max_pages=max_pages, out_file=out_file,
+                        download_images=download_images, **kwargs)
 
 
 # Allow script to run standalone
 if __name__ == "__main__":
+    if "--replay" in sys.argv:
+        # Rebuild raw_products.csv from the response archive, no network
+        replay_archive(out_file="raw_products.csv")
+        sys.exit(0)
+    
     num_products = scrape_laptops(search_term="laptop", max_pages=5, out_file="raw_products.csv")
     print(f"Total products scraped: {num_products}")
     
@@ -0,0 +1,151 @@
+"""
+Single-pass extraction of laptop specs from product titles.
+One combined alternation holds the vocabulary of every attribute, each in
+its own named group, so a title is scanned once however many attributes are
+extracted. The first token of each attribute in a title wins, and tokens are
+then turned into column values with cheap per-column parsing.
+
+With pyarrow installed, ASCII titles are scanned with the same alternation
+by its RE2 kernels: each call finds the next token of every title still
+being scanned and hands back the rest of the title, so titles are still
+read once, left to right, just a token at a time across the whole column.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+# Attribute -> vocabulary, matched against lowercased titles. Alternatives
+# starting at the same position are tried in order, so longer forms come first.
+VOCABULARY = {
+    "gpu": r"(?:geforce\s?)?(?:rtx|gtx)\s?-?[0-9]{3,4}(?:\s?ti)?|(?:geforce\s?)?mx\s?[0-9]{3}"
+           r"|radeon(?:\s?rx\s?[0-9]{3,4}[a-z]?)?|iris\s?xe|uhd\s?graphics|arc\s?a[0-9]{3}|geforce",
+    "screen": r"\b1[0-8](?:\.[0-9])?\s?-?(?:\"|”|''|inch|in\b)",
+    # Intel suffixes: "u", "hx", or a letter and a digit as in "1135g7"
+    "cpu_gen": r"\b[0-9]{1,2}(?:st|nd|rd|th)\s?gen|\bi[3579][\s-]?[0-9]{4,5}(?:[a-z]{1,2}|[a-z][0-9])?\b"
+               r"|ryzen\s?[3579][\s-]?[0-9]{4}[a-z]{0,2}\b",
+    "refresh": r"\b[0-9]{2,3}\s?hz",
+    "storage_type": r"ssd|nvme|hdd|emmc",
+}
+WORD_ATTRIBUTES = ["gpu", "screen", "cpu_gen", "refresh"]
+
+SPEC_ALTERNATION = (
+    r"\b(?:"
+    + "|".join(f"(?P<{name}>{VOCABULARY[name]})" for name in WORD_ATTRIBUTES)
+    + f")|(?P<storage_type>{VOCABULARY['storage_type']})"
+)
+
+# Every token but the storage type starts a word, and every token starts with
+# one of a few characters; checking both first lets the scanner skip most
+# positions without trying each alternative
+SPEC_PATTERN = re.compile(f"(?=[0-9rgmuiasenh])(?:{SPEC_ALTERNATION})")
+
+# RE2 has no lookahead or finditer: the leftmost token, then the rest of the
+# title. Capturing several tokens per call is far slower in RE2 than a call
+# per token
+NEXT_TOKEN_PATTERN = f"(?s)(?P<token>{SPEC_ALTERNATION})(?P<rest>.*)$"
+
+SPEC_COLUMNS = ["gpu", "screen_in", "cpu_gen", "refresh_hz", "storage_type"]
+
+def _tokenize(lower):
+    """First token of every attribute in each title, from one scan per title"""
+    first = {name: [None] * len(lower) for name in VOCABULARY}
+    for i, text in enumerate(lower.tolist()):
+        for match in SPEC_PATTERN.finditer(text):
+            column = first[match.lastgroup]
+            if column[i] is None:
+                column[i] = match.group()
+    return pd.DataFrame(first, index=lower.index, dtype=object)
+
+def _tokenize_arrow(lower):
+    """
+    First token of every attribute in each lowercased ASCII title, with RE2.
+
+    Same tokens as _tokenize: every round matches the leftmost token of the
+    titles still being scanned and carries on from its end, so a token
+    never starts inside an earlier one ("mx 450 hz" has no refresh rate).
+    Titles drop out once they have no tokens left or every attribute is found.
+    """
+    first = {name: np.full(len(lower), None, dtype=object) for name in VOCABULARY}
+    missing = {name: np.ones(len(lower), dtype=bool) for name in VOCABULARY}
+    rows = np.arange(len(lower))
+    while len(rows):
+        found = pc.extract_regex(lower, NEXT_TOKEN_PATTERN)
+        matched = found.is_valid().to_numpy(zero_copy_only=False)
+        rows, found = rows[matched], found.filter(matched)
+        for name in VOCABULARY:
+            # Groups of the other attributes come back empty
+            tokens = pc.struct_field(found, [name])
+            new = missing[name][rows] & pc.not_equal(tokens, "").to_numpy(zero_copy_only=False)
+            first[name][rows[new]] = tokens.filter(new).to_numpy(zero_copy_only=False)
+            missing[name][rows[new]] = False
+
+        scanning = np.logical_or.reduce([missing[name][rows] for name in VOCABULARY])
+        rows, found = rows[scanning], found.filter(scanning)
+        # Carry the word boundary over: "_" after a word character, " " otherwise
+        ends_word = pc.match_substring_regex(pc.struct_field(found, ["token"]), r"\w$")
+        lower = pc.binary_join_element_wise(pc.if_else(ends_word, "_", " "),
+                                            pc.struct_field(found, ["rest"]), "")
+    return first
+
+def _parse_distinct(tokens, parse):
+    """Run a column parser over the distinct tokens only, then spread the values back"""
+    codes, uniques = pd.factorize(tokens)
+    parsed = parse(pd.Series(uniques, dtype=object)).reset_index(drop=True)
+    # Code -1 (no token) reindexes to a missing value
+    return pd.Series(parsed.reindex(codes).to_numpy(), index=tokens.index)
+
+def _screen_size(tokens):
+    return pd.to_numeric(tokens.str.extract(r"([0-9.]+)", expand=False)).astype(float)
+
+def _refresh_rate(tokens):
+    return pd.to_numeric(tokens.str.extract(r"([0-9]+)", expand=False)).astype(float)
+
+def _cpu_generation(tokens):
+    """Generation number from '12th gen', 'i5-1235u', 'i7 8550u' or 'ryzen 5 5500u' tokens"""
+    ordinal = tokens.str.extract(r"^([0-9]+)", expand=False)
+    model = tokens.str.extract(r"i[3579][\s-]?([0-9]{4,5})", expand=False)
+    # 10th gen and later have five digits (10210u) or start with 1 (1135g7)
+    intel = model.str[:2].where(model.str.len().eq(5) | model.str.startswith("1"), model.str[:1])
+    ryzen = tokens.str.extract(r"ryzen\s?[3579][\s-]?([0-9])", expand=False)
+    return pd.to_numeric(ordinal.fillna(intel).fillna(ryzen)).astype(float)
+
+def _gpu_name(tokens):
+    name = tokens.str.replace(r"[\s-]", "", regex=True)
+    return name.str.replace(r"^geforce(?=.)", "", regex=True).replace({"uhdgraphics": "uhd"})
+
+def extract_specs(titles):
+    """
+    Extract GPU, screen size, CPU generation, refresh rate and storage type.
+
+    Args:
+        titles (Series): Product titles
+
+    Returns:
+        DataFrame: SPEC_COLUMNS aligned with `titles`; missing specs are NaN
+    """
+    text = titles.astype(object).where(titles.notna(), "").map(str)
+    if pa is None:
+        first = _tokenize(text.str.lower())
+    else:
+        array = pa.array(text.to_numpy(), type=pa.string())
+        first = pd.DataFrame(_tokenize_arrow(pc.ascii_lower(array)), index=titles.index, dtype=object)
+        other = ~pc.string_is_ascii(array).to_numpy(zero_copy_only=False)
+        if other.any():
+            first[other] = _tokenize(text[other].str.lower())
+
+    # A handful of distinct tokens ("15.6\"", "rtx 3050") cover most titles
+    return pd.DataFrame({
+        "gpu": _parse_distinct(first["gpu"], _gpu_name),
+        "screen_in": _parse_distinct(first["screen"], _screen_size).astype(float),
+        "cpu_gen": _parse_distinct(first["cpu_gen"], _cpu_generation).astype(float),
+        "refresh_hz": _parse_distinct(first["refresh"], _refresh_rate).astype(float),
+        "storage_type": _parse_distinct(first["storage_type"], lambda tokens: tokens.replace({"nvme": "ssd"})),
+    }, index=titles.index)
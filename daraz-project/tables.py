@@ -0,0 +1,250 @@
+"""
+Declared dtypes and storage of the product tables.
+Each pipeline stage loads and writes its table through this schema instead of
+pandas' defaults: categoricals for the few repeated labels (brand, cpu, ...),
+the smallest integer type that holds spec sizes and counts, and float32 for
+prices, ratings and projections. Columns not listed keep pandas' defaults.
+
+Tables are handed between stages as Arrow IPC files next to their CSV
+(processed_products.csv -> processed_products.arrow), which readers
+memory-map and load only the needed columns of. The CSV is still written
+as an export.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+RAW_SCHEMA = {
+    "brand": "category",
+    "price": "float32",
+    "rating": "float32",
+    "reviews": "float32",
+    "search_term": "category",
+}
+
+PROCESSED_SCHEMA = {
+    **RAW_SCHEMA,
+    # Filled with 0 by preprocess, so never missing
+    "reviews": "uint32",
+    "ram_gb": "uint16",
+    "storage_gb": "uint32",
+    "cpu": "category",
+    "gpu": "category",
+    "screen_in": "float32",
+    "cpu_gen": "float32",
+    "refresh_hz": "float32",
+    "storage_type": "category",
+}
+
+ENHANCED_SCHEMA = {
+    **PROCESSED_SCHEMA,
+    "dedicated_gpu": "uint8",
+    "ssd": "uint8",
+    "cluster_kmeans": "int16",
+    "cluster_dbscan": "int32",
+    "PCA1": "float32",
+    "PCA2": "float32",
+    "UMAP1": "float32",
+    "UMAP2": "float32",
+    "composite_score": "float32",
+}
+
+SCHEMAS = {"raw": RAW_SCHEMA, "processed": PROCESSED_SCHEMA, "enhanced": ENHANCED_SCHEMA}
+
+def _is_int(dtype):
+    return dtype not in ("category",) and np.issubdtype(np.dtype(dtype), np.integer)
+
+def conform(df, table):
+    """
+    Cast the columns of a table to their declared dtypes.
+
+    Integer columns that still have gaps, or values out of the declared
+    type's range, are left as they are rather than truncated.
+
+    Args:
+        df (DataFrame): Table to cast
+        table (str): "raw", "processed" or "enhanced"
+
+    Returns:
+        DataFrame: The table with declared dtypes applied
+    """
+    dtypes = {}
+    for col, dtype in SCHEMAS[table].items():
+        if col not in df or df[col].dtype == dtype:
+            continue
+        if _is_int(dtype):
+            values = df[col]
+            limits = np.iinfo(dtype)
+            if values.isna().any() or values.min() < limits.min or values.max() > limits.max:
+                continue
+        dtypes[col] = dtype
+    return df.astype(dtypes) if dtypes else df
+
+def read_csv(path, table, **kwargs):
+    """
+    Load a table from CSV with its declared dtypes.
+
+    Categorical and float columns are parsed straight into their final type;
+    integer columns are cast once parsed, as they may hold gaps.
+
+    Args:
+        path (str): CSV file
+        table (str): "raw", "processed" or "enhanced"
+        **kwargs: Passed on to pd.read_csv (e.g. chunksize, usecols)
+
+    Returns:
+        DataFrame (or an iterator of them with chunksize)
+    """
+    parse = {col: dtype for col, dtype in SCHEMAS[table].items() if not _is_int(dtype)}
+    frames = pd.read_csv(path, dtype=parse, **kwargs)
+    if isinstance(frames, pd.DataFrame):
+        return conform(frames, table)
+    return (conform(chunk, table) for chunk in frames)
+
+def arrow_path(csv_path):
+    """Arrow file kept alongside a CSV table"""
+    return os.path.splitext(csv_path)[0] + ".arrow"
+
+def read(path, table, columns=None):
+    """
+    Load a table, from its Arrow file when it is at least as new as the CSV.
+
+    Args:
+        path (str): CSV path of the table
+        table (str): "raw", "processed" or "enhanced"
+        columns (list): Only load these columns (those missing from the file are skipped)
+
+    Returns:
+        DataFrame: The table with declared dtypes
+    """
+    arrow_file = arrow_path(path)
+    if os.path.exists(arrow_file) and (not os.path.exists(path) or
+                                       os.path.getmtime(arrow_file) >= os.path.getmtime(path)):
+        if columns is not None:
+            names = pa.ipc.open_file(pa.memory_map(arrow_file)).schema.names
+            columns = [col for col in columns if col in names]
+        df = feather.read_table(arrow_file, columns=columns, memory_map=True).to_pandas()
+        return conform(df, table)
+
+    usecols = None if columns is None else (lambda col: col in columns)
+    return read_csv(path, table, usecols=usecols)
+
+def _write_atomic(path, write):
+    tmp_file = path + ".tmp"
+    write(tmp_file)
+    os.replace(tmp_file, path)
+
+def write(df, path, table, csv=True):
+    """
+    Write a table as Arrow IPC, plus a CSV export.
+
+    Args:
+        df (DataFrame): Table to write
+        path (str): CSV path of the table
+        table (str): "raw", "processed" or "enhanced"
+        csv (bool): Also write the CSV export
+
+    Returns:
+        DataFrame: The table with declared dtypes
+    """
+    df = conform(df, table).reset_index(drop=True)
+    if csv:
+        _write_atomic(path, lambda f: df.to_csv(f, index=False, encoding="utf-8"))
+    # Written last, so it is never older than the CSV it was written with.
+    # Uncompressed, so readers can memory-map it
+    _write_atomic(arrow_path(path), lambda f: feather.write_feather(df, f, compression="uncompressed"))
+    return df
+
+def _arrow_schema(columns, table):
+    """
+    Arrow schema of a table from its declared dtypes.
+
+    Labels are stored as plain strings, as every chunk has its own
+    categories, and undeclared columns are text. Nothing is inferred from
+    the data, where an all-empty text column would look numeric.
+
+    Integer columns are stored as nullable int64: conform() leaves a chunk's
+    column uncast when it has gaps or values out of the declared range, and
+    a later chunk may. read() narrows them again where the whole table fits,
+    as write() would have stored them.
+    """
+    declared = SCHEMAS[table]
+    fields = []
+    for col in columns:
+        dtype = declared.get(col)
+        if dtype is None or dtype == "category":
+            fields.append(pa.field(col, pa.string()))
+        elif _is_int(dtype):
+            fields.append(pa.field(col, pa.int64()))
+        else:
+            fields.append(pa.field(col, pa.from_numpy_dtype(np.dtype(dtype))))
+    return pa.schema(fields)
+
+class TableWriter:
+    """Writes a table chunk by chunk as Arrow IPC and a CSV export"""
+
+    def __init__(self, path, table):
+        """
+        Args:
+            path (str): CSV path of the table
+            table (str): "raw", "processed" or "enhanced"
+        """
+        self.path = path
+        self.arrow_file = arrow_path(path)
+        self.table = table
+        self.schema = None
+        self.rows = 0
+        self._csv = open(path + ".tmp", "w", encoding="utf-8", newline="")
+        self._arrow = None
+
+    def write(self, df):
+        df = conform(df, self.table)
+        df.to_csv(self._csv, index=False, header=(self._arrow is None))
+        if self._arrow is None:
+            self.schema = _arrow_schema(df.columns, self.table)
+            self._arrow = pa.ipc.new_file(self.arrow_file + ".tmp", self.schema)
+        # Labels become categoricals again when read
+        batch = pa.Table.from_pandas(df, preserve_index=False)
+        self._arrow.write_table(batch.cast(self.schema))
+        self.rows += len(df)
+        return df
+
+    def close(self):
+        """Finish both files and move them into place"""
+        self._csv.close()
+        if self._arrow is None:
+            # No chunks at all: leave an empty CSV and no Arrow file
+            os.replace(self.path + ".tmp", self.path)
+            if os.path.exists(self.arrow_file):
+                os.remove(self.arrow_file)
+            return
+        self._arrow.close()
+        os.replace(self.path + ".tmp", self.path)
+        os.replace(self.arrow_file + ".tmp", self.arrow_file)
+
+def records(df):
+    """
+    Rows as dicts for JSON responses.
+
+    float32 values are widened through their shortest decimal form, so a
+    rating of 4.3 is sent as 4.3 rather than 4.300000190734863, and missing
+    values become None (JSON null) rather than NaN, which is not valid JSON.
+    """
+    narrow = {col: df[col].astype(str).astype("float64") for col in df if df[col].dtype == "float32"}
+    df = df.assign(**narrow).astype(object)
+    return df.where(df.notna(), None).to_dict('records')
+
+def memory_report(df, stage):
+    """
+    Print how much memory a stage's table takes.
+
+    Returns:
+        int: Size in bytes, strings included
+    """
+    size = int(df.memory_usage(deep=True).sum())
+    print(f"🧮 {stage}: {len(df)} rows, {size / 1024**2:.1f} MB in memory")
+    return size